@@ -0,0 +1,163 @@
+"""
+Text removal for animated GIFs and videos. Frames are decoded as a stream
+and CRAFT only runs on keyframes: the first frame, scene changes, and
+every `keyframe_interval` frames. Every other frame reuses the current
+keyframe's mask, frames sharing a mask are inpainted together, and exact
+repeats of the previous frame reuse its output. Work therefore follows
+how much the content changes rather than the frame count.
+"""
+import io
+import cv2
+import numpy as np
+from PIL import Image, ImageSequence
+
+from metrics import stage
+
+THUMBNAIL_WIDTH = 96
+PIXEL_CHANGE = 24  # grey levels before a thumbnail pixel counts as changed
+
+
+def gif_frames(image):
+    """(RGB frame, duration in ms) for every frame of an opened GIF."""
+    for frame in ImageSequence.Iterator(image):
+        yield np.array(frame.convert('RGB')), frame.info.get('duration', 100)
+
+
+def video_frames(path):
+    """(RGB frame, duration in ms) for every frame of a video file, decoded one at a time."""
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError('Could not read video')
+    duration = 1000.0 / (capture.get(cv2.CAP_PROP_FPS) or 25.0)
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            yield frame[:, :, ::-1].copy(), duration  # BGR to RGB
+    finally:
+        capture.release()
+
+
+class SceneDetector:
+    """
+    Flags keyframes: a frame is a keyframe when more than `threshold` of its
+    thumbnail pixels differ from the last keyframe's, or when
+    `keyframe_interval` frames have passed since it.
+    """
+
+    def __init__(self, threshold=0.01, keyframe_interval=30):
+        self.threshold = threshold
+        self.keyframe_interval = keyframe_interval
+        self.key_thumbnail = None
+        self.since_key = 0
+
+    def is_keyframe(self, frame):
+        h, w = frame.shape[:2]
+        size = (THUMBNAIL_WIDTH, max(1, round(h * THUMBNAIL_WIDTH / w)))
+        thumbnail = cv2.cvtColor(cv2.resize(frame, size, interpolation=cv2.INTER_AREA), cv2.COLOR_RGB2GRAY)
+
+        self.since_key += 1
+        if self.key_thumbnail is not None and self.key_thumbnail.shape == thumbnail.shape \
+                and self.since_key < self.keyframe_interval:
+            changed = np.count_nonzero(cv2.absdiff(thumbnail, self.key_thumbnail) > PIXEL_CHANGE)
+            if changed <= self.threshold * thumbnail.size:
+                return False
+        self.key_thumbnail = thumbnail
+        self.since_key = 0
+        return True
+
+
+def remove_text_frames(pipeline, frames, quality=None, scene_threshold=0.01, keyframe_interval=30,
+                       batch_size=8, summary=None):
+    """
+    Yield (cleaned RGB frame, duration) for every (frame, duration) in
+    `frames`, in order. `summary`, if given, collects frame counts, the
+    inpainting tiers used and the text found on each keyframe.
+    """
+    summary = summary if summary is not None else {}
+    summary.update({'frames': 0, 'keyframes': 0, 'inpainted_frames': 0, 'repeated_frames': 0,
+                    'tiers': {}, 'text_coordinates': []})
+    scenes = SceneDetector(scene_threshold, keyframe_interval)
+    state = {'mask': None, 'last_frame': None, 'last_output': None}
+    pending = []  # [frame, duration, is_repeat] sharing state['mask']
+
+    def flush():
+        fresh = [frame for frame, _, repeat in pending if not repeat]
+        if fresh and state['mask'].any():
+            # One shared mask object: its tiles are computed once and every frame's crops go in one inpainter call
+            outputs, tiers = pipeline.inpaint_batch(fresh, [state['mask']] * len(fresh), quality)
+        else:
+            outputs, tiers = fresh, ['none'] * len(fresh)
+        summary['inpainted_frames'] += sum(tier != 'none' for tier in tiers)
+        for tier in tiers:
+            summary['tiers'][tier] = summary['tiers'].get(tier, 0) + 1
+
+        outputs = iter(outputs)
+        for _, duration, repeat in pending:
+            if not repeat:
+                state['last_output'] = next(outputs)
+            yield state['last_output'], duration
+        pending.clear()
+
+    for index, (frame, duration) in enumerate(frames):
+        summary['frames'] += 1
+        last = state['last_frame']
+        if last is not None and last.shape == frame.shape and np.array_equal(last, frame):
+            summary['repeated_frames'] += 1
+            pending.append([frame, duration, True])
+            continue
+        state['last_frame'] = frame
+
+        if scenes.is_keyframe(frame):
+            if pending:
+                yield from flush()
+            summary['keyframes'] += 1
+            with stage('keyframe'):
+                boxes, state['mask'] = pipeline.detect_and_mask_batch([frame])[0]
+            if len(boxes):
+                summary['text_coordinates'].extend(dict(item, frame=index) for item in pipeline.ocr(frame, boxes))
+
+        pending.append([frame, duration, False])
+        if sum(not repeat for _, _, repeat in pending) >= batch_size:
+            yield from flush()
+
+    if pending:
+        yield from flush()
+    if summary['frames'] == 0:
+        raise ValueError('No frames decoded')
+
+
+def encode_gif(frames, loop=None):
+    """
+    Encode (RGB frame, duration) pairs as an animated GIF; frames are
+    palettized as they arrive. `loop` is the loop count (0 loops forever);
+    None plays the animation once.
+    """
+    images, durations = [], []
+    for frame, duration in frames:
+        images.append(Image.fromarray(frame).convert('P', palette=Image.ADAPTIVE))
+        durations.append(int(round(duration)))
+    if not images:
+        raise ValueError('No frames to encode')
+    buffer = io.BytesIO()
+    options = {} if loop is None else {'loop': loop}
+    images[0].save(buffer, format='GIF', save_all=True, append_images=images[1:], duration=durations, **options)
+    return buffer.getvalue()
+
+
+def encode_video(frames, path):
+    """Stream (RGB frame, duration) pairs into an MP4 file at `path`; returns (frame count, width, height)."""
+    writer = None
+    count, width, height = 0, 0, 0
+    try:
+        for frame, duration in frames:
+            if writer is None:
+                height, width = frame.shape[:2]
+                writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 1000.0 / duration, (width, height))
+            writer.write(frame[:, :, ::-1])  # RGB to BGR
+            count += 1
+    finally:
+        if writer is not None:
+            writer.release()
+    return count, width, height
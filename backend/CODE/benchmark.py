@@ -0,0 +1,168 @@
+import os
+import io
+import sys
+import json
+import time
+import platform
+import argparse
+import numpy as np
+
+from synthetic_data import synthetic_image, encode_png
+from metrics import current_rss, PEAK_RSS
+
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def parse_resolutions(value):
+    """'640x480,1920x1080' -> [(640, 480), (1920, 1080)]"""
+    return [tuple(int(v) for v in item.lower().split('x')) for item in value.split(',') if item]
+
+
+def summarize(stage, width, height, density, seconds, peak_rss_bytes, extra=None):
+    """Latency percentiles, throughput and memory for one benchmark case."""
+    seconds = np.array(seconds)
+    summary = {
+        'stage': stage,
+        'width': width,
+        'height': height,
+        'text_lines': density,
+        'runs': len(seconds),
+        'p50_ms': round(float(np.percentile(seconds, 50)) * 1000, 3),
+        'p95_ms': round(float(np.percentile(seconds, 95)) * 1000, 3),
+        'mean_ms': round(float(seconds.mean()) * 1000, 3),
+        'throughput_per_s': round(len(seconds) / float(seconds.sum()), 3) if seconds.sum() > 0 else None,
+        'rss_bytes': current_rss(),
+        'peak_rss_bytes': peak_rss_bytes
+    }
+    summary.update(extra or {})
+    return summary
+
+
+def timed(func, repeats, warmup):
+    """
+    Run `func` warmup + repeats times; returns the last result, the measured
+    durations and the peak process RSS sampled during the measured runs.
+    """
+    result = None
+    for _ in range(warmup):
+        result = func()
+    seconds = []
+    token, _ = PEAK_RSS.open()
+    try:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = func()
+            seconds.append(time.perf_counter() - start)
+    finally:
+        peak = PEAK_RSS.close(token)
+    return result, seconds, peak
+
+
+def bench_stages(pipeline, image, repeats, warmup, quality):
+    """Time each pipeline stage on its own; returns {stage: (durations, peak RSS, extra)}."""
+    boxes, detect_s, detect_peak = timed(lambda: pipeline.detect(image), repeats, warmup)
+    mask, mask_s, mask_peak = timed(lambda: pipeline.mask(image, boxes), repeats, warmup)
+    (_, tier), inpaint_s, inpaint_peak = timed(lambda: pipeline.inpaint(image, mask, quality), repeats, warmup)
+    _, ocr_s, ocr_peak = timed(lambda: pipeline.ocr(image, boxes), repeats, warmup)
+
+    mask_ratio = round(float(np.count_nonzero(mask)) / mask.size, 5)
+    return {
+        'detect_text': (detect_s, detect_peak, {'boxes': len(boxes)}),
+        'create_mask': (mask_s, mask_peak, {'mask_ratio': mask_ratio}),
+        'inpaint_image': (inpaint_s, inpaint_peak, {'inpaint_tier': tier, 'mask_ratio': mask_ratio}),
+        'crop_and_ocr': (ocr_s, ocr_peak, {'regions': len(boxes)})
+    }
+
+
+def bench_upload(client, image, repeats, warmup, quality):
+    """Time the full /upload request through the Flask app."""
+    payload = encode_png(image)
+    data = {} if quality is None else {'quality': quality}
+
+    def upload():
+        form = dict(data, image=(io.BytesIO(payload), 'bench.png'))
+        response = client.post('/upload', data=form, content_type='multipart/form-data')
+        if response.status_code != 200:
+            raise RuntimeError(f"/upload returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return response
+
+    _, seconds, peak = timed(upload, repeats, warmup)
+    return seconds, peak, {'upload_bytes': len(payload)}
+
+
+def main(args):
+    resolutions = parse_resolutions(args.resolutions)
+    densities = [int(d) for d in args.densities.split(',') if d]
+
+    # The app reads its configuration from the environment at import time
+    os.environ['UNMARKR_BACKEND'] = args.backend
+    os.environ['UNMARKR_CACHE'] = '0'  # repeats reuse the same image, so the cache would hide the work
+    os.environ['UNMARKR_BACKGROUND_LOAD'] = '0'  # models must be loaded before anything is timed
+    if args.backend == 'stub':
+        os.environ.setdefault('UNMARKR_OCR_ENGINE', 'stub')
+    if args.quality:
+        os.environ['UNMARKR_QUALITY'] = args.quality
+
+    sys.path.append(backend_dir)
+    os.chdir(backend_dir)
+    import app as server
+
+    pipeline = server.pipeline
+    client = server.app.test_client() if args.upload else None
+
+    results = []
+    for width, height in resolutions:
+        for density in densities:
+            image = synthetic_image(width, height, density, seed=args.seed)
+            print(f"Benchmarking {width}x{height}, {density} text lines")
+
+            for stage, (seconds, peak, extra) in bench_stages(pipeline, image, args.repeats, args.warmup,
+                                                              args.quality).items():
+                results.append(summarize(stage, width, height, density, seconds, peak, extra))
+
+            if client is not None:
+                seconds, peak, extra = bench_upload(client, image, args.repeats, args.warmup, args.quality)
+                results.append(summarize('upload', width, height, density, seconds, peak, extra))
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'backend': args.backend,
+            'quality': args.quality or server.INPAINT_QUALITY,
+            'repeats': args.repeats,
+            'warmup': args.warmup,
+            'seed': args.seed,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'pipeline_params': pipeline.params(args.quality)
+        },
+        'results': results
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f"Benchmark report saved to {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark each pipeline stage and the /upload flow on synthetic images")
+    parser.add_argument('--backend', type=str, default='stub', choices=['stub', 'torch', 'torchscript', 'onnx'],
+                        help='Model backend; stub needs no downloaded weights')
+    parser.add_argument('--resolutions', type=str, default='640x480,1280x720,1920x1080,3840x2160',
+                        help='Comma-separated WIDTHxHEIGHT list')
+    parser.add_argument('--densities', type=str, default='0,5,20',
+                        help='Comma-separated numbers of text lines per image')
+    parser.add_argument('--quality', type=str, default=None, help='Inpainting quality tier (default: server default)')
+    parser.add_argument('--repeats', type=int, default=5, help='Measured runs per case')
+    parser.add_argument('--warmup', type=int, default=1, help='Unmeasured runs per case')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic images')
+    parser.add_argument('--no_upload', dest='upload', action='store_false', help='Skip the end-to-end /upload benchmark')
+    parser.add_argument('--output', type=str, help='Path to save the JSON report (default: stdout)')
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,267 @@
+"""
+Offline bulk text removal over a directory tree. Decoding, CRAFT/LaMa
+inference and OCR + writing run concurrently, connected by bounded queues
+so memory stays flat over long runs. Every processed image is appended to
+a JSONL manifest (coordinates and text included), which is also what makes
+runs resumable: inputs already recorded as done are skipped.
+"""
+import os
+import json
+import time
+import argparse
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+from pipeline import TextRemovalPipeline, QUALITY_LEVELS, BACKENDS
+
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff')
+MANIFEST_NAME = 'results.jsonl'
+
+
+def find_images(input_dir):
+    """Relative paths of every image under `input_dir`, in a stable order."""
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for filename in sorted(files):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.relpath(os.path.join(root, filename), input_dir)
+
+
+def read_manifest(path):
+    """Inputs already recorded as done in a manifest."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by an interrupted run
+            if record.get('status') == 'done':
+                done.add(record['input'])
+    return done
+
+
+def decode(path):
+    """Read an image file as an RGB array."""
+    image = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError('Could not decode image')
+    return image[:, :, ::-1].copy()  # BGR to RGB
+
+
+def write_image(path, image, jpeg_quality=95):
+    """Encode and write atomically, so an interrupted run never leaves a partial output."""
+    extension = os.path.splitext(path)[1]
+    params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality] if extension in ('.jpg', '.jpeg') else []
+    success, buffer = cv2.imencode(extension, image[:, :, ::-1], params)
+    if not success:
+        raise ValueError('Could not encode cleaned image')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(buffer.tobytes())
+    os.replace(tmp_path, path)
+
+
+class Manifest:
+    """Append-only JSONL of processed images, flushed line by line."""
+
+    def __init__(self, path):
+        self.file = open(path, 'a', encoding='utf-8')
+        self.lock = threading.Lock()
+        self.counts = {'done': 0, 'failed': 0}
+
+    def write(self, record):
+        with self.lock:
+            self.file.write(json.dumps(record) + '\n')
+            self.file.flush()
+            self.counts[record['status']] += 1
+
+    def close(self):
+        self.file.close()
+
+
+class BulkProcessor:
+    """
+    Three concurrent stages: a decode pool feeding at most `prefetch` images
+    ahead, inference batches on the calling thread, and a finish pool doing
+    OCR, encoding and writing while the next batch runs.
+    """
+
+    def __init__(self, pipeline, input_dir, output_dir, manifest, quality=None, output_format='jpg',
+                 jpeg_quality=95, batch_size=4, prefetch=16, decode_workers=2, finish_workers=2):
+        self.pipeline = pipeline
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.manifest = manifest
+        self.quality = quality
+        self.output_format = output_format
+        self.jpeg_quality = jpeg_quality
+        self.batch_size = batch_size
+        self.decoded = queue.Queue()
+        self.decode_slots = threading.BoundedSemaphore(prefetch)
+        self.finish_slots = threading.BoundedSemaphore(prefetch)
+        self.decode_pool = ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix='decode')
+        self.finish_pool = ThreadPoolExecutor(max_workers=finish_workers, thread_name_prefix='finish')
+
+    def output_path(self, relpath):
+        """Output file for an input; the source extension is kept, so a.png and a.jpg never share one."""
+        return os.path.join(self.output_dir, relpath + '.' + self.output_format)
+
+    def run(self, relpaths, log_every=30.0):
+        """Process every relative path; returns the manifest counts."""
+        producer = threading.Thread(target=self._produce, args=(relpaths,), name='bulk-producer', daemon=True)
+        producer.start()
+
+        start = last_log = time.time()
+        finished = False
+        while not finished:
+            batch, finished = self._next_batch()
+            if batch:
+                self._infer(batch)
+            if time.time() - last_log >= log_every:
+                last_log = time.time()
+                self._log_progress(start)
+
+        self.finish_pool.shutdown(wait=True)
+        self._log_progress(start)
+        return dict(self.manifest.counts)
+
+    def _produce(self, relpaths):
+        for relpath in relpaths:
+            self.decode_slots.acquire()
+            self.decode_pool.submit(self._decode, relpath)
+        self.decode_pool.shutdown(wait=True)
+        self.decoded.put(None)
+
+    def _decode(self, relpath):
+        try:
+            self.decoded.put((relpath, decode(os.path.join(self.input_dir, relpath)), None))
+        except Exception as e:
+            self.decoded.put((relpath, None, str(e)))
+
+    def _next_batch(self):
+        """Block for one decoded image, then take whatever else is ready, up to `batch_size`."""
+        batch = []
+        item = self.decoded.get()
+        while item is not None:
+            self.decode_slots.release()
+            relpath, image, error = item
+            if error is None:
+                batch.append((relpath, image))
+            else:
+                self.manifest.write({'input': relpath, 'status': 'failed', 'error': error})
+            if len(batch) >= self.batch_size:
+                return batch, False
+            try:
+                item = self.decoded.get_nowait()
+            except queue.Empty:
+                return batch, False
+        return batch, True
+
+    def _infer(self, batch):
+        images = [image for _, image in batch]
+        try:
+            results = self.pipeline.run_batch(images, self.quality, with_ocr=False)
+        except Exception as e:
+            if len(batch) == 1:
+                relpath, _ = batch[0]
+                self.manifest.write({'input': relpath, 'status': 'failed', 'error': str(e) or type(e).__name__})
+                return
+            # Retry one by one so a single bad image does not fail its whole batch
+            for item in batch:
+                self._infer([item])
+            return
+        for (relpath, image), result in zip(batch, results):
+            self.finish_slots.acquire()
+            self.finish_pool.submit(self._finish, relpath, image, result)
+
+    def _finish(self, relpath, image, result):
+        try:
+            text_coordinates = self.pipeline.ocr(image, result['boxes'])
+            output_path = self.output_path(relpath)
+            write_image(output_path, result['cleaned_image'], self.jpeg_quality)
+            self.manifest.write({
+                'input': relpath,
+                'output': os.path.relpath(output_path, self.output_dir),
+                'status': 'done',
+                'width': image.shape[1],
+                'height': image.shape[0],
+                'inpaint_tier': result['inpaint_tier'],
+                'text_coordinates': text_coordinates
+            })
+        except Exception as e:
+            self.manifest.write({'input': relpath, 'status': 'failed', 'error': str(e)})
+        finally:
+            self.finish_slots.release()
+
+    def _log_progress(self, start):
+        elapsed = max(time.time() - start, 1e-9)
+        counts = self.manifest.counts
+        print(f"{counts['done']} done, {counts['failed']} failed, "
+              f"{counts['done'] / elapsed:.2f} images/s over {elapsed:.0f}s")
+
+
+def main(args):
+    input_dir = os.path.abspath(args.input_dir)
+    output_dir = os.path.abspath(args.output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = args.manifest or os.path.join(output_dir, MANIFEST_NAME)
+
+    done = read_manifest(manifest_path)
+    relpaths = [relpath for relpath in find_images(input_dir) if relpath not in done]
+    print(f"{len(relpaths)} images to process, {len(done)} already done")
+    if not relpaths:
+        return
+
+    pipeline = TextRemovalPipeline(args.craft_path, args.lama_path, radius=args.radius, quality=args.quality,
+                                   max_batch_size=args.batch_size, ocr_workers=args.ocr_workers,
+                                   ocr_engine=args.ocr_engine, tile_inpainting=not args.no_tiles,
+                                   working_max_side=args.working_max_side, backend=args.backend)
+    manifest = Manifest(manifest_path)
+    processor = BulkProcessor(pipeline, input_dir, output_dir, manifest, quality=args.quality,
+                              output_format=args.format, jpeg_quality=args.jpeg_quality,
+                              batch_size=args.batch_size, prefetch=args.prefetch,
+                              decode_workers=args.decode_workers, finish_workers=args.finish_workers)
+    try:
+        counts = processor.run(relpaths, log_every=args.log_every)
+    finally:
+        manifest.close()
+        pipeline.ocr_pool.close()
+    print(f"Finished: {counts['done']} done, {counts['failed']} failed. Manifest: {manifest_path}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Remove text from every image under a directory tree (resumable)")
+    parser.add_argument('--input_dir', type=str, required=True, help='Root folder of the images to clean')
+    parser.add_argument('--output_dir', type=str, required=True, help='Folder for cleaned images, mirroring the input tree')
+    parser.add_argument('--manifest', type=str, help=f'JSONL manifest path (default: <output_dir>/{MANIFEST_NAME})')
+    parser.add_argument('--backend', type=str, default='torch', choices=list(BACKENDS), help='Model backend')
+    parser.add_argument('--craft_path', type=str, default=os.path.join(backend_dir, 'CRAFT', 'craft_mlt_25k.pth'),
+                        help='Path to the pre-trained CRAFT weights')
+    parser.add_argument('--lama_path', type=str, default=os.path.join(backend_dir, 'lama', 'big-lama'),
+                        help='Path to the big-lama model folder')
+    parser.add_argument('--quality', type=str, default='refine', choices=list(QUALITY_LEVELS), help='Inpainting quality tier')
+    parser.add_argument('--radius', type=int, default=5, help='Mask dilation radius')
+    parser.add_argument('--working_max_side', type=int, default=2048,
+                        help='Longer side large images are processed at (0 = full resolution)')
+    parser.add_argument('--no_tiles', action='store_true', help='Inpaint whole images instead of tiles around the text')
+    parser.add_argument('--format', type=str, default='jpg', choices=['jpg', 'png'], help='Output image format')
+    parser.add_argument('--jpeg_quality', type=int, default=95, help='JPEG quality of the cleaned images')
+    parser.add_argument('--batch_size', type=int, default=4, help='Images per inference batch')
+    parser.add_argument('--prefetch', type=int, default=16, help='Decoded images buffered ahead of inference')
+    parser.add_argument('--decode_workers', type=int, default=2, help='Image decoding threads')
+    parser.add_argument('--finish_workers', type=int, default=2, help='Threads running OCR and writing outputs')
+    parser.add_argument('--ocr_workers', type=int, default=4, help='Text regions OCR\'d concurrently per image')
+    parser.add_argument('--ocr_engine', type=str, default='pytesseract', choices=['pytesseract', 'tesserocr', 'stub'],
+                        help='OCR backend')
+    parser.add_argument('--log_every', type=float, default=30.0, help='Seconds between progress lines')
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,104 @@
+"""
+Runtime backend for CRAFT and LaMa graphs exported by export_models.py
+(TorchScript or ONNX), optionally with an int8 CRAFT. Loading a frozen
+graph skips building the networks and importing the lama/lightning stack,
+and the graphs run without autograd bookkeeping. LaMa's refinement needs
+gradients through the eager model, so every LaMa tier runs single-pass here.
+"""
+import os
+import torch
+
+import craft_detector
+from inpaint_utils import predict_padded_batches
+
+EXPORT_SUFFIXES = {'torchscript': '.torchscript.pt', 'onnx': '.onnx'}
+# Format LaMa is exported and loaded in for each backend. LaMa's Fourier convolutions use
+# torch.fft, which the torch 2.0 ONNX exporter cannot export, so the onnx backend pairs an
+# ONNX CRAFT with a TorchScript LaMa.
+LAMA_FORMATS = {'torchscript': 'torchscript', 'onnx': 'torchscript'}
+
+
+def export_path(weights_path, fmt, quantized=False):
+    """Where the exported graph for a weights file lives, e.g. craft_mlt_25k.int8.onnx."""
+    stem = os.path.splitext(weights_path)[0]
+    return stem + ('.int8' if quantized else '') + EXPORT_SUFFIXES[fmt]
+
+
+class OnnxModel:
+    """
+    onnxruntime session called like the TorchScript module (torch tensors in
+    and out). The session is created on first use in each process, because
+    onnxruntime's thread pools do not survive the model-worker fork.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.model_bytes = f.read()
+        self.session = None
+        self.pid = None
+
+    def __call__(self, *tensors):
+        if self.session is None or self.pid != os.getpid():
+            import onnxruntime
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = torch.get_num_threads()
+            self.session = onnxruntime.InferenceSession(self.model_bytes, options, providers=['CPUExecutionProvider'])
+            self.pid = os.getpid()
+        names = [node.name for node in self.session.get_inputs()]
+        outputs = self.session.run(None, {name: tensor.numpy() for name, tensor in zip(names, tensors)})
+        outputs = tuple(torch.from_numpy(output) for output in outputs)
+        return outputs if len(outputs) > 1 else outputs[0]
+
+
+def load_graph(path, fmt):
+    """Load an exported graph as a callable."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No exported model at {path}; run export_models.py first")
+    if fmt == 'onnx':
+        return OnnxModel(path)
+    model = torch.jit.load(path, map_location='cpu')
+    model.eval()
+    return model
+
+
+def predict_batch(images, masks, model, max_batch_size=4):
+    """Single-pass inpainting with an exported LaMa graph, batched like inpaint_lama.predict_batch."""
+    def forward(image_batch, mask_batch):
+        image_tensor = torch.from_numpy(image_batch).float().permute(0, 3, 1, 2) / 255.0
+        mask_tensor = (torch.from_numpy(mask_batch).unsqueeze(1) > 0).float()
+        with torch.no_grad():
+            inpainted = model(image_tensor.contiguous(), mask_tensor)
+        return inpainted.permute(0, 2, 3, 1).numpy()
+
+    return predict_padded_batches(images, masks, forward, max_batch_size)
+
+
+class CompiledBackend:
+    """Backend object with the same functions TextRemovalPipeline calls on craft_detector and inpaint_lama."""
+
+    def __init__(self, fmt='torchscript', craft_int8=False):
+        if fmt not in EXPORT_SUFFIXES:
+            raise ValueError(f"Unknown export format: {fmt}")
+        self.fmt = fmt
+        self.craft_int8 = craft_int8
+
+    def load_craft_model(self, model_path):
+        path = export_path(model_path, self.fmt, self.craft_int8)
+        print("Loading exported CRAFT graph from:", path)
+        return load_graph(path, self.fmt)
+
+    def load_lama_model(self, config_path, checkpoint_path, device='cpu'):
+        fmt = LAMA_FORMATS[self.fmt]
+        path = export_path(checkpoint_path, fmt)
+        print("Loading exported LaMa graph from:", path)
+        return load_graph(path, fmt), 'cpu'
+
+    def forward_batch(self, net, images, canvas_size=1280, mag_ratio=1.5, max_batch_size=8):
+        return craft_detector.forward_batch(net, images, canvas_size, mag_ratio, max_batch_size)
+
+    def postprocess_scores(self, score_text, score_link, target_ratio, text_threshold=0.7, low_text=0.4, link_threshold=0.4):
+        return craft_detector.postprocess_scores(score_text, score_link, target_ratio,
+                                                 text_threshold, low_text, link_threshold)
+
+    def inpaint_images(self, images, masks, model, device, refine=True, n_iters=5, max_scales=3, max_batch_size=4):
+        return predict_batch(images, masks, model, max_batch_size=max_batch_size)
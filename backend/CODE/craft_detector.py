@@ -1,6 +1,7 @@
 import os
 import sys
 import argparse
+import cv2
 import numpy as np
 import torch
 from collections import OrderedDict
@@ -32,31 +33,17 @@ def load_craft_model(model_path):
     net.eval()
     return net
 
-def detect_text(net, image_path, text_threshold=0.7, low_text=0.4, link_threshold=0.4, canvas_size=1280, mag_ratio=1.5):
-    """
-    Detect text regions in an image using the CRAFT model.
-    """
-    # Load image
-    image = imgproc.loadImage(image_path)
-
-    # Resize image
+def preprocess_image(image, canvas_size=1280, mag_ratio=1.5):
+    """Resize and normalize an RGB image; returns the [c, h, w] array and the resize ratio."""
     img_resized, target_ratio, _ = imgproc.resize_aspect_ratio(
         image, canvas_size, interpolation=cv2.INTER_LINEAR, mag_ratio=mag_ratio
     )
-    ratio_h = ratio_w = 1 / target_ratio
-
-    # Preprocessing
     x = imgproc.normalizeMeanVariance(img_resized)
-    x = torch.from_numpy(x).permute(2, 0, 1)  # [h, w, c] to [c, h, w]
-    x = x.unsqueeze(0)  # [c, h, w] to [b, c, h, w]
+    return x.transpose(2, 0, 1), target_ratio  # [h, w, c] to [c, h, w]
 
-    # Forward pass
-    with torch.no_grad():
-        y, _ = net(x)
-
-    # Extract score maps
-    score_text = y[0, :, :, 0].cpu().data.numpy()
-    score_link = y[0, :, :, 1].cpu().data.numpy()
+def postprocess_scores(score_text, score_link, target_ratio, text_threshold=0.7, low_text=0.4, link_threshold=0.4):
+    """Turn CRAFT score maps into an (N, 4, 2) int32 box array in original image coordinates."""
+    ratio_h = ratio_w = 1 / target_ratio
 
     # Post-processing to get bounding boxes
     boxes, _ = craft_utils.getDetBoxes(
@@ -66,16 +53,65 @@ def detect_text(net, image_path, text_threshold=0.7, low_text=0.4, link_threshol
     # Adjust coordinates
     boxes = craft_utils.adjustResultCoordinates(boxes, ratio_w, ratio_h)
 
-    # Format for GaRNet (x1,y1,x2,y2,x3,y3,x4,y4)
-    garnet_boxes = []
-    for box in boxes:
-        # Ensure box has 4 points
-        if len(box) == 4:
-            # Flatten the points and format as integers
-            formatted_box = ",".join([str(int(coord)) for point in box for coord in point])
-            garnet_boxes.append(formatted_box)
+    # Keep only boxes with 4 points, truncated to integer coordinates
+    boxes = [box for box in boxes if len(box) == 4]
+    if not boxes:
+        return np.zeros((0, 4, 2), dtype=np.int32)
+    return np.array(boxes, dtype=np.float32).astype(np.int32)
 
-    return garnet_boxes
+def forward_batch(net, images, canvas_size=1280, mag_ratio=1.5, max_batch_size=8):
+    """
+    Run CRAFT over several RGB images. Images are bucketed by their resized
+    shape and every bucket goes through one forward pass; returns a
+    (score_text, score_link, target_ratio) tuple per image, in input order.
+    """
+    prepared = [preprocess_image(image, canvas_size, mag_ratio) for image in images]
+
+    # Bucket by resized shape so each bucket stacks into a single tensor
+    buckets = {}
+    for idx, (x, _) in enumerate(prepared):
+        buckets.setdefault(x.shape, []).append(idx)
+
+    results = [None] * len(images)
+    for indices in buckets.values():
+        for start in range(0, len(indices), max_batch_size):
+            chunk = indices[start:start + max_batch_size]
+            x = torch.from_numpy(np.stack([prepared[idx][0] for idx in chunk]))
+
+            # Forward pass
+            with torch.no_grad():
+                y, _ = net(x)
+            y = y.cpu().data.numpy()
+
+            # Split the score maps back out per image
+            for i, idx in enumerate(chunk):
+                results[idx] = (y[i, :, :, 0], y[i, :, :, 1], prepared[idx][1])
+    return results
+
+def detect_boxes_batch(net, images, text_threshold=0.7, low_text=0.4, link_threshold=0.4, canvas_size=1280, mag_ratio=1.5, max_batch_size=8):
+    """Detect text regions in several RGB images; returns an (N, 4, 2) box array per image."""
+    scores = forward_batch(net, images, canvas_size, mag_ratio, max_batch_size)
+    return [
+        postprocess_scores(score_text, score_link, target_ratio, text_threshold, low_text, link_threshold)
+        for score_text, score_link, target_ratio in scores
+    ]
+
+def detect_boxes(net, image, **kwargs):
+    """
+    Detect text regions in an image using the CRAFT model.
+    `image` is either a path or an RGB numpy array; returns an (N, 4, 2) int32 box array.
+    """
+    # Load image
+    if isinstance(image, str):
+        image = imgproc.loadImage(image)
+    return detect_boxes_batch(net, [image], **kwargs)[0]
+
+def detect_text(net, image, **kwargs):
+    """
+    Detect text regions and format them for GaRNet (x1,y1,x2,y2,x3,y3,x4,y4).
+    """
+    boxes = detect_boxes(net, image, **kwargs)
+    return [",".join(map(str, row)) for row in boxes.reshape(-1, 8).tolist()]
 
 def save_to_txt(boxes, output_path):
     """Save the detected bounding boxes to a .txt file."""
@@ -110,6 +146,4 @@ def main():
     save_to_txt(detected_boxes, args.output_path)
 
 if __name__ == "__main__":
-    # Workaround for OpenCV issue with argument parsing
-    import cv2
     main() 
\ No newline at end of file
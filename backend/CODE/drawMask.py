@@ -4,24 +4,56 @@ import argparse
 import numpy as np
 
 def parse_coordinates(txt_path):
-    boxes = []
+    """Read a CRAFT coordinate file into an (N, 4, 2) int32 box array."""
     with open(txt_path, 'r') as f:
-        for line in f:
-            if ',' in line:
-                coords = list(map(int, map(float, line.strip().split(',')[:8])))
-                box = np.array(coords, dtype=np.int32).reshape((-1, 1, 2))
-                boxes.append(box)
-    return boxes
+        rows = [line.strip().split(',')[:8] for line in f if ',' in line]
+    if not rows:
+        return np.zeros((0, 4, 2), dtype=np.int32)
+    return np.array(rows, dtype=np.float64).astype(np.int32).reshape((-1, 4, 2))
 
 def create_mask(image_shape, boxes, radius=0):
+    """
+    Rasterize (N, 4, 2) boxes into a binary mask. All polygons are filled in
+    a single fillPoly call; fillPoly uses even-odd filling, so polygons whose
+    bounding boxes overlap another are filled again on their own.
+    """
     mask = np.zeros(image_shape[:2], dtype=np.uint8)
-    for box in boxes:
-        cv2.fillPoly(mask, [box], 255)
+    boxes = np.asarray(boxes, dtype=np.int32).reshape((-1, 4, 2))
+    if len(boxes):
+        cv2.fillPoly(mask, list(boxes), 255)
+        lo, hi = boxes.min(axis=1), boxes.max(axis=1)
+        overlaps = (lo[:, None] <= hi[None]).all(-1) & (lo[None] <= hi[:, None]).all(-1)
+        np.fill_diagonal(overlaps, False)
+        for idx in np.flatnonzero(overlaps.any(axis=1)):
+            cv2.fillPoly(mask, [boxes[idx]], 255)
+    return dilate_mask(mask, radius)
+
+def dilate_mask(mask, radius=0):
+    """Expand a binary mask with an elliptical kernel of the given size."""
     if radius > 0:
         kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (radius, radius))
         mask = cv2.dilate(mask, kernel, iterations=1)
     return mask
 
+def polygon_mask(image_shape, polygons, radius=0):
+    """Rasterize arbitrary polygons (flat [x1, y1, x2, y2, ...] lists) into a dilated binary mask."""
+    mask = np.zeros(image_shape[:2], dtype=np.uint8)
+    for polygon in polygons:
+        cv2.fillPoly(mask, [np.asarray(polygon, dtype=np.int32).reshape((-1, 2))], 255)
+    return dilate_mask(mask, radius)
+
+def mask_from_scores(score_text, score_link, target_ratio, image_shape, low_text=0.4, link_threshold=0.4):
+    """
+    Build a text mask straight from the CRAFT score maps, skipping box
+    extraction: threshold at the score-map resolution, then scale to the image.
+    """
+    h, w = image_shape[:2]
+    # Score maps are half the resized image, which is padded to a multiple of 32
+    valid_h = min(score_text.shape[0], int(np.ceil(h * target_ratio / 2)))
+    valid_w = min(score_text.shape[1], int(np.ceil(w * target_ratio / 2)))
+    text_map = (score_text[:valid_h, :valid_w] > low_text) | (score_link[:valid_h, :valid_w] > link_threshold)
+    return cv2.resize(text_map.astype(np.uint8) * 255, (w, h), interpolation=cv2.INTER_NEAREST)
+
 def main(args):
     os.makedirs(args.output_folder, exist_ok=True)
 
@@ -0,0 +1,214 @@
+import os
+import json
+import argparse
+import tempfile
+import cv2
+import numpy as np
+import torch
+
+import craft_detector
+import inpaint_lama
+from compiled_models import export_path, load_graph, predict_batch, LAMA_FORMATS
+from drawMask import create_mask
+
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+class LamaGraph(torch.nn.Module):
+    """LaMa's single-pass predict step (mask, generator, blend) as one exportable module."""
+
+    def __init__(self, generator):
+        super().__init__()
+        self.generator = generator
+
+    def forward(self, image, mask):
+        masked = torch.cat([image * (1 - mask), mask], dim=1)
+        predicted = self.generator(masked)
+        return mask * predicted + (1 - mask) * image
+
+
+def load_images(folder):
+    """RGB images from a folder, sorted by name."""
+    images = []
+    for filename in sorted(os.listdir(folder)):
+        if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+            images.append(cv2.imread(os.path.join(folder, filename))[:, :, ::-1].copy())
+    if not images:
+        raise ValueError(f"No images found in {folder}")
+    return images
+
+
+def craft_input(image):
+    """CRAFT's preprocessed [1, 3, h, w] input tensor for an RGB image."""
+    x, _ = craft_detector.preprocess_image(image)
+    return torch.from_numpy(x).unsqueeze(0)
+
+
+def quantize_craft(net, calibration_images):
+    """
+    Static int8 post-training quantization of CRAFT (FX graph mode),
+    calibrated on real images. Dynamic quantization only covers Linear/RNN
+    layers, and CRAFT is all convolutions.
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    torch.backends.quantized.engine = 'fbgemm'
+    example = craft_input(calibration_images[0])
+    prepared = prepare_fx(net, get_default_qconfig_mapping('fbgemm'), example_inputs=(example,))
+    with torch.no_grad():
+        for image in calibration_images:
+            prepared(craft_input(image))
+    return convert_fx(prepared)
+
+
+def export_craft(model_path, fmt, quantize, images):
+    net = craft_detector.load_craft_model(model_path)
+    example = craft_input(images[0])
+    path = export_path(model_path, fmt, quantize)
+
+    if fmt == 'torchscript':
+        if quantize:
+            net = quantize_craft(net, images)
+        with torch.no_grad():
+            traced = torch.jit.freeze(torch.jit.trace(net, example))
+        traced.save(path)
+    else:
+        target = path
+        if quantize:
+            target = os.path.join(tempfile.mkdtemp(), 'craft_fp32.onnx')
+        torch.onnx.export(net, example, target, input_names=['image'], output_names=['scores', 'feature'],
+                          dynamic_axes={'image': {0: 'batch', 2: 'height', 3: 'width'},
+                                        'scores': {0: 'batch', 1: 'score_height', 2: 'score_width'},
+                                        'feature': {0: 'batch', 2: 'score_height', 3: 'score_width'}},
+                          opset_version=17)
+        if quantize:
+            # onnxruntime's dynamic quantization does cover Conv (as ConvInteger)
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            quantize_dynamic(target, path, weight_type=QuantType.QUInt8)
+    print(f"Exported CRAFT ({fmt}{', int8' if quantize else ''}) to: {path}")
+
+
+def export_lama(lama_path, fmt, images):
+    """Export single-pass LaMa; an 'onnx' request writes TorchScript instead (see LAMA_FORMATS)."""
+    if LAMA_FORMATS[fmt] != fmt:
+        print(f"LaMa cannot be exported as {fmt} (no FFT support in the exporter); exporting {LAMA_FORMATS[fmt]} instead")
+        fmt = LAMA_FORMATS[fmt]
+    config_path = os.path.join(lama_path, 'config.yaml')
+    checkpoint_path = os.path.join(lama_path, 'models', 'best.ckpt')
+    model, _ = inpaint_lama.load_lama_model(config_path, checkpoint_path, device='cpu')
+    graph = LamaGraph(model.generator).eval()
+
+    image = cv2.resize(images[0], (512, 512))
+    example_image = torch.from_numpy(image).float().permute(2, 0, 1).unsqueeze(0) / 255.0
+    example_mask = torch.zeros(1, 1, 512, 512)
+    example_mask[:, :, 192:320, 128:384] = 1
+    path = export_path(checkpoint_path, fmt)
+
+    with torch.no_grad():
+        traced = torch.jit.freeze(torch.jit.trace(graph, (example_image, example_mask)))
+    traced.save(path)
+    print(f"Exported LaMa ({fmt}) to: {path}")
+
+
+def mask_iou(shape, boxes_a, boxes_b):
+    """IoU of the masks rasterized from two box arrays (1.0 when both are empty)."""
+    a = create_mask(shape, boxes_a) > 0
+    b = create_mask(shape, boxes_b) > 0
+    union = np.count_nonzero(a | b)
+    return 1.0 if union == 0 else np.count_nonzero(a & b) / union
+
+
+def check_craft(eager, model_path, fmt, quantize, images):
+    """Score-map and detected-area agreement between eager and exported CRAFT."""
+    exported = load_graph(export_path(model_path, fmt, quantize), fmt)
+    report = []
+    for image in images:
+        (text_a, link_a, ratio), = craft_detector.forward_batch(eager, [image])
+        (text_b, link_b, _), = craft_detector.forward_batch(exported, [image])
+        boxes_a = craft_detector.postprocess_scores(text_a, link_a, ratio)
+        boxes_b = craft_detector.postprocess_scores(text_b, link_b, ratio)
+        report.append({
+            'max_score_diff': float(max(np.abs(text_a - text_b).max(), np.abs(link_a - link_b).max())),
+            'boxes_eager': len(boxes_a),
+            'boxes_exported': len(boxes_b),
+            'mask_iou': round(mask_iou(image.shape, boxes_a, boxes_b), 4)
+        })
+    return report
+
+
+def check_lama(lama_path, fmt, images, craft_net):
+    """Inpainted-pixel agreement between eager single-pass LaMa and the exported graph."""
+    config_path = os.path.join(lama_path, 'config.yaml')
+    checkpoint_path = os.path.join(lama_path, 'models', 'best.ckpt')
+    model, device = inpaint_lama.load_lama_model(config_path, checkpoint_path, device='cpu')
+    fmt = LAMA_FORMATS[fmt]
+    exported = load_graph(export_path(checkpoint_path, fmt), fmt)
+    report = []
+    for image in images:
+        mask = create_mask(image.shape, craft_detector.detect_boxes(craft_net, image), radius=5)
+        if not mask.any():
+            continue
+        eager_out = inpaint_lama.predict_batch([image], [mask], model, device)[0].astype(np.float32)
+        exported_out = predict_batch([image], [mask], exported)[0].astype(np.float32)
+        diff = np.abs(eager_out - exported_out)[mask > 0]
+        mse = float(np.mean(diff ** 2))
+        report.append({
+            'mean_pixel_diff': round(float(diff.mean()), 4),
+            'psnr': round(10 * np.log10(255.0 ** 2 / mse), 2) if mse > 0 else None
+        })
+    return report
+
+
+def main(args):
+    images = load_images(args.test_dir)
+    craft_path = os.path.abspath(args.craft_path)
+    lama_path = os.path.abspath(args.lama_path)
+
+    if args.model in ('craft', 'all'):
+        export_craft(craft_path, args.format, args.quantize, images)
+    if args.model in ('lama', 'all'):
+        export_lama(lama_path, args.format, images)
+
+    if not args.check:
+        return 0
+
+    # Accuracy check against the eager models on the test images
+    max_score_diff = args.max_score_diff if args.max_score_diff is not None else (0.15 if args.quantize else 0.05)
+    passed = True
+    craft_report, lama_report = [], []
+    craft_net = craft_detector.load_craft_model(craft_path)
+    if args.model in ('craft', 'all'):
+        craft_report = check_craft(craft_net, craft_path, args.format, args.quantize, images)
+        for row in craft_report:
+            row['passed'] = row['max_score_diff'] <= max_score_diff and row['mask_iou'] >= args.min_mask_iou
+            passed = passed and row['passed']
+    if args.model in ('lama', 'all'):
+        lama_report = check_lama(lama_path, args.format, images, craft_net)
+        for row in lama_report:
+            row['passed'] = row['mean_pixel_diff'] <= args.max_pixel_diff
+            passed = passed and row['passed']
+
+    print(json.dumps({'craft': craft_report, 'lama': lama_report, 'passed': passed}, indent=2))
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export CRAFT and LaMa as TorchScript or ONNX graphs for CPU inference")
+    parser.add_argument('--model', type=str, default='all', choices=['craft', 'lama', 'all'], help='Which network to export')
+    parser.add_argument('--format', type=str, default='torchscript', choices=['torchscript', 'onnx'], help='Export format')
+    parser.add_argument('--quantize', action='store_true', help='Also quantize CRAFT to int8 (saved as a separate .int8 export)')
+    parser.add_argument('--craft_path', type=str, default=os.path.join(backend_dir, 'CRAFT', 'craft_mlt_25k.pth'),
+                        help='Path to the pre-trained CRAFT weights')
+    parser.add_argument('--lama_path', type=str, default=os.path.join(backend_dir, 'lama', 'big-lama'),
+                        help='Path to the big-lama model folder')
+    parser.add_argument('--test_dir', type=str, default=os.path.join(backend_dir, 'TESTDATA', 'IMG'),
+                        help='Images used for int8 calibration and the accuracy check')
+    parser.add_argument('--check', action='store_true', help='Compare the exported graphs with the eager models')
+    parser.add_argument('--max_score_diff', type=float, default=None,
+                        help='Largest allowed CRAFT score-map difference (default: 0.05, or 0.15 with --quantize)')
+    parser.add_argument('--min_mask_iou', type=float, default=0.9, help='Smallest allowed IoU of the detected text areas')
+    parser.add_argument('--max_pixel_diff', type=float, default=2.0, help='Largest allowed mean LaMa pixel difference (0-255)')
+
+    args = parser.parse_args()
+    raise SystemExit(main(args))
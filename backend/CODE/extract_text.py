@@ -2,7 +2,16 @@ import cv2
 import pytesseract
 import os
 import argparse
+import threading
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+# Optional: persistent in-process Tesseract API (pip install tesserocr)
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
 
 def read_coordinates(txt_path):
     boxes = []
@@ -13,8 +22,16 @@ def read_coordinates(txt_path):
                 boxes.append(coords)
     return boxes
 
-def crop_and_ocr(image, box):
+def crop_region(image, box):
+    """
+    Crop a box out of a BGR image, blank the pixels outside it and return it
+    as grayscale. Boxes reaching past the edges are clipped to the image;
+    returns None when nothing of the box is left.
+    """
     pts = np.array(box, dtype=np.int32).reshape((4, 2))
+    pts = np.clip(pts, 0, [image.shape[1] - 1, image.shape[0] - 1]).astype(np.int32)
+    if cv2.contourArea(pts) == 0:
+        return None
 
     rect = cv2.boundingRect(pts)
     x, y, w, h = rect
@@ -26,27 +43,99 @@ def crop_and_ocr(image, box):
     cv2.fillPoly(mask, [pts_shifted], 255)
     cropped = cv2.bitwise_and(cropped, cropped, mask=mask)
 
-    gray = cv2.cvtColor(cropped, cv2.COLOR_BGR2GRAY)
+    return cv2.cvtColor(cropped, cv2.COLOR_BGR2GRAY)
+
+def crop_and_ocr(image, box):
+    gray = crop_region(image, box)
+    if gray is None:
+        return "NA"
     text = pytesseract.image_to_string(gray, config='--psm 6').strip()
 
     return text if text else "NA"
 
-def process(image_path, coor_path, output_path):
-    image = cv2.imread(image_path)
-    boxes = read_coordinates(coor_path)
+class OcrPool:
+    """
+    Runs OCR over many text regions concurrently. With engine='pytesseract'
+    each region still spawns a tesseract process; engine='tesserocr' keeps one
+    Tesseract API handle per worker thread and reuses it for every crop.
+    engine='stub' only crops and returns "NA", for offline benchmarks.
+    """
+
+    def __init__(self, workers=1, engine='pytesseract'):
+        if engine not in ('pytesseract', 'tesserocr', 'stub'):
+            raise ValueError(f"Unknown OCR engine: {engine}")
+        if engine == 'tesserocr' and tesserocr is None:
+            raise ImportError("engine='tesserocr' requires the tesserocr package")
+        self.engine = engine
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ocr') if workers > 1 else None
+        self.local = threading.local()
+
+    def ocr(self, image, box):
+        """OCR a single box of a BGR image."""
+        if self.engine == 'pytesseract':
+            return crop_and_ocr(image, box)
+        if self.engine == 'stub':
+            crop_region(image, box)
+            return "NA"
+
+        api = getattr(self.local, 'api', None)
+        if api is None:
+            # --psm 6 equivalent, created once per thread
+            api = self.local.api = tesserocr.PyTessBaseAPI(psm=tesserocr.PSM.SINGLE_BLOCK)
+        gray = crop_region(image, box)
+        if gray is None:
+            return "NA"
+        api.SetImage(Image.fromarray(gray))
+        text = api.GetUTF8Text().strip()
+        return text if text else "NA"
+
+    def map(self, image, boxes):
+        """OCR every box, keeping input order; returns a list of (box, text) pairs."""
+        if self.executor is None:
+            texts = [self.ocr(image, box) for box in boxes]
+        else:
+            texts = list(self.executor.map(lambda box: self.ocr(image, box), boxes))
+        return list(zip(boxes, texts))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+def process(image, boxes, output_path=None, ocr_pool=None):
+    """
+    Run OCR over the boxes. `image` is a path or BGR numpy array and `boxes`
+    a coordinate .txt path or a list of 8-value boxes. Results are written to
+    `output_path` when given and returned as a list of (box, text) pairs.
+    Pass an OcrPool to OCR the regions concurrently.
+    """
+    if isinstance(image, str):
+        image = cv2.imread(image)
+    if isinstance(boxes, str):
+        boxes = read_coordinates(boxes)
+
+    if ocr_pool is not None:
+        results = ocr_pool.map(image, boxes)
+    else:
+        results = [(box, crop_and_ocr(image, box)) for box in boxes]
 
-    with open(output_path, 'w', encoding='utf-8') as f:
-        for box in boxes:
-            text = crop_and_ocr(image, box)
-            line = ",".join(map(str, box)) + f",{text}"
-            f.write(line + '\n')
-    print(f"Output saved to {output_path}")
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            for box, text in results:
+                line = ",".join(map(str, box)) + f",{text}"
+                f.write(line + '\n')
+        print(f"Output saved to {output_path}")
+    return results
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('--image_path', type=str, required=True, help="Path to the input image")
     parser.add_argument('--coor_path', type=str, required=True, help="Path to the .txt file with box coordinates")
     parser.add_argument('--output_path', type=str, required=True, help="Path to save the output .txt with text")
+    parser.add_argument('--workers', type=int, default=1, help="Number of regions to OCR concurrently")
+    parser.add_argument('--engine', type=str, default='pytesseract', choices=['pytesseract', 'tesserocr', 'stub'],
+                        help="OCR backend; tesserocr reuses one Tesseract handle per worker")
     args = parser.parse_args()
 
-    process(args.image_path, args.coor_path, args.output_path)
+    ocr_pool = OcrPool(workers=args.workers, engine=args.engine)
+    process(args.image_path, args.coor_path, args.output_path, ocr_pool=ocr_pool)
+    ocr_pool.close()
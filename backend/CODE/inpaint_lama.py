@@ -7,6 +7,8 @@ import numpy as np
 import argparse
 from omegaconf import OmegaConf
 
+from inpaint_utils import predict_padded_batches
+
 lama_root = os.path.join(os.path.dirname(__file__), '..', 'lama')
 sys.path.insert(0, lama_root)
 
@@ -43,9 +45,15 @@ def load_lama_model(config_path, checkpoint_path, device='cuda' if torch.cuda.is
     return model, device
 
 
-def inpaint_image(image_path, mask_path, model, device):
-    image = cv2.imread(image_path)[:, :, ::-1].copy()
-    mask = cv2.imread(mask_path, cv2.IMREAD_GRAYSCALE)
+def inpaint_image(image, mask, model, device, n_iters=5, max_scales=3):
+    """
+    Inpaint the masked area with LaMa's multi-scale refinement.
+    `image`/`mask` are paths or RGB/grayscale numpy arrays.
+    """
+    if isinstance(image, str):
+        image = cv2.imread(image)[:, :, ::-1].copy()
+    if isinstance(mask, str):
+        mask = cv2.imread(mask, cv2.IMREAD_GRAYSCALE)
 
     image_tensor = torch.from_numpy(image).float().permute(2, 0, 1).unsqueeze(0) / 255.0
     mask_tensor = torch.from_numpy(mask).float().unsqueeze(0).unsqueeze(0) / 255.0
@@ -63,10 +71,10 @@ def inpaint_image(image_path, mask_path, model, device):
         inpainter=model,
         gpu_ids=gpu_ids,
         modulo=8,
-        n_iters=5,
+        n_iters=n_iters,
         lr=0.01,
         min_side=256,
-        max_scales=3,
+        max_scales=max_scales,
         px_budget=1024 * 1024
     )
 
@@ -74,12 +82,44 @@ def inpaint_image(image_path, mask_path, model, device):
     return inpainted.astype(np.uint8)
 
 
+def predict_batch(images, masks, model, device, max_batch_size=4):
+    """
+    Single-pass LaMa forward (no refinement) over several RGB images.
+    Images are bucketed by padded shape and each bucket runs as one batch;
+    returns the inpainted RGB images in input order.
+    """
+    def forward(image_batch, mask_batch):
+        image_tensor = torch.from_numpy(image_batch).float().permute(0, 3, 1, 2) / 255.0
+        mask_tensor = torch.from_numpy(mask_batch).float().unsqueeze(1) / 255.0
+        batch = move_to_device({'image': image_tensor, 'mask': (mask_tensor > 0).float()}, device)
+        with torch.no_grad():
+            batch = model(batch)
+        return batch['inpainted'].permute(0, 2, 3, 1).cpu().numpy()
+
+    return predict_padded_batches(images, masks, forward, max_batch_size)
+
+
+def inpaint_images(images, masks, model, device, refine=True, n_iters=5, max_scales=3, max_batch_size=4):
+    """
+    Inpaint several RGB images. LaMa's refinement only handles one image at a
+    time, so refined images run sequentially; without refinement they are batched.
+    """
+    if refine:
+        return [inpaint_image(image, mask, model, device, n_iters=n_iters, max_scales=max_scales)
+                for image, mask in zip(images, masks)]
+    return predict_batch(images, masks, model, device, max_batch_size=max_batch_size)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('--model_path', type=str, required=True, help='Path to big-lama model folder')
     parser.add_argument('--image_folder', type=str, required=True, help='Path to input image folder')
     parser.add_argument('--mask_folder', type=str, required=True, help='Path to input mask folder')
     parser.add_argument('--output_folder', type=str, required=True, help='Path to save inpainted output')
+    parser.add_argument('--no_refine', action='store_true', help='Single-pass LaMa without refinement (allows batching)')
+    parser.add_argument('--n_iters', type=int, default=5, help='Refinement iterations per scale')
+    parser.add_argument('--max_scales', type=int, default=3, help='Refinement scales')
+    parser.add_argument('--batch_size', type=int, default=1, help='Images per forward pass when --no_refine is set')
 
     args = parser.parse_args()
 
@@ -90,6 +130,7 @@ if __name__ == "__main__":
 
     model, device = load_lama_model(config_path, checkpoint_path)
 
+    pending = []
     for filename in os.listdir(args.image_folder):
         if not filename.lower().endswith(('.jpg', '.jpeg', '.png')):
             continue
@@ -100,8 +141,17 @@ if __name__ == "__main__":
         if not os.path.exists(mask_path):
             print(f"Skipping {filename}: Mask not found.")
             continue
-
-        result = inpaint_image(image_path, mask_path, model, device)
-        out_path = os.path.join(args.output_folder, filename)
-        cv2.imwrite(out_path, result[:, :, ::-1])  # RGB to BGR
-        print(f"Inpainted saved: {out_path}")
+        pending.append((filename, image_path, mask_path))
+
+    batch_size = max(args.batch_size, 1)
+    for start in range(0, len(pending), batch_size):
+        chunk = pending[start:start + batch_size]
+        images = [cv2.imread(image_path)[:, :, ::-1].copy() for _, image_path, _ in chunk]
+        masks = [cv2.imread(mask_path, cv2.IMREAD_GRAYSCALE) for _, _, mask_path in chunk]
+
+        results = inpaint_images(images, masks, model, device, refine=not args.no_refine,
+                                 n_iters=args.n_iters, max_scales=args.max_scales, max_batch_size=batch_size)
+        for (filename, _, _), result in zip(chunk, results):
+            out_path = os.path.join(args.output_folder, filename)
+            cv2.imwrite(out_path, result[:, :, ::-1])  # RGB to BGR
+            print(f"Inpainted saved: {out_path}")
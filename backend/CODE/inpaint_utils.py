@@ -0,0 +1,138 @@
+import cv2
+import numpy as np
+
+# Inpainting quality tiers, cheapest first
+INPAINT_TIERS = ('classical', 'fast', 'refine')
+
+
+def inpaint_classical(image, mask, method='telea', radius=3):
+    """Cheap OpenCV inpainting (Telea or Navier-Stokes), good enough for tiny masks."""
+    flags = cv2.INPAINT_TELEA if method == 'telea' else cv2.INPAINT_NS
+    return cv2.inpaint(image, (mask > 0).astype(np.uint8) * 255, radius, flags)
+
+
+def pad_to_modulo(array, modulo=8):
+    """Symmetric-pad an HxW[xC] array so both sides are multiples of `modulo`."""
+    h, w = array.shape[:2]
+    pad = [(0, (modulo - h % modulo) % modulo), (0, (modulo - w % modulo) % modulo)]
+    pad += [(0, 0)] * (array.ndim - 2)
+    return np.pad(array, pad, mode='symmetric')
+
+
+def predict_padded_batches(images, masks, forward, max_batch_size=4):
+    """
+    Single-pass inpainting over several RGB images, shared by the LaMa
+    backends. Images and masks are padded to a multiple of 8 and bucketed by
+    padded shape; each chunk of up to `max_batch_size` goes to
+    `forward(images, masks)` as uint8 [N, H, W, 3] and [N, H, W] arrays, which
+    returns [N, H, W, 3] floats in 0..1. Returns the unpadded uint8 results
+    in input order.
+    """
+    padded = [(pad_to_modulo(image), pad_to_modulo(mask)) for image, mask in zip(images, masks)]
+
+    buckets = {}
+    for idx, (image, _) in enumerate(padded):
+        buckets.setdefault(image.shape, []).append(idx)
+
+    results = [None] * len(images)
+    for indices in buckets.values():
+        for start in range(0, len(indices), max_batch_size):
+            chunk = indices[start:start + max_batch_size]
+            inpainted = forward(np.stack([padded[idx][0] for idx in chunk]), np.stack([padded[idx][1] for idx in chunk]))
+
+            # Unpad and split per image
+            for i, idx in enumerate(chunk):
+                h, w = images[idx].shape[:2]
+                results[idx] = np.clip(inpainted[i, :h, :w] * 255.0, 0, 255).astype(np.uint8)
+    return results
+
+
+def merge_rects(rects):
+    """Merge overlapping (x0, y0, x1, y1) rectangles until none overlap."""
+    rects = list(rects)
+    merged = True
+    while merged:
+        merged = False
+        out = []
+        while rects:
+            x0, y0, x1, y1 = rects.pop()
+            i = 0
+            while i < len(rects):
+                a0, b0, a1, b1 = rects[i]
+                if a0 < x1 and x0 < a1 and b0 < y1 and y0 < b1:
+                    x0, y0, x1, y1 = min(x0, a0), min(y0, b0), max(x1, a1), max(y1, b1)
+                    rects.pop(i)
+                    merged = True
+                else:
+                    i += 1
+            out.append((x0, y0, x1, y1))
+        rects = out
+    return rects
+
+
+def mask_tiles(mask, padding=64, min_size=128):
+    """
+    Padded tiles around the connected components of a mask, merged where
+    they overlap; returns (x0, y0, x1, y1) rectangles clipped to the image.
+    """
+    h, w = mask.shape[:2]
+    num, _, stats, _ = cv2.connectedComponentsWithStats((mask > 0).astype(np.uint8), connectivity=8)
+
+    rects = []
+    for x, y, bw, bh, _ in stats[1:].tolist():  # label 0 is the background
+        # Grow small components so LaMa sees enough surrounding context
+        pad_x = padding + max(0, min_size - bw - 2 * padding) // 2
+        pad_y = padding + max(0, min_size - bh - 2 * padding) // 2
+        rects.append((max(0, x - pad_x), max(0, y - pad_y), min(w, x + bw + pad_x), min(h, y + bh + pad_y)))
+    return merge_rects(rects)
+
+
+def inpaint_regions(image, mask, inpaint_fn, padding=64, max_area_ratio=0.5):
+    """
+    Inpaint only padded tiles around the masked areas and paste the masked
+    pixels back into the original, so cost scales with the text area rather
+    than the image size. `inpaint_fn(images, masks)` inpaints a list of
+    crops. Falls back to the full image when the tiles cover more than
+    `max_area_ratio` of it.
+    """
+    return inpaint_regions_batch([image], [mask], inpaint_fn, padding, max_area_ratio)[0]
+
+
+def inpaint_regions_batch(images, masks, inpaint_fn, padding=64, max_area_ratio=0.5):
+    """
+    inpaint_regions() over several images with a single `inpaint_fn` call
+    for the tiles of all of them (and the whole images that fall back), so
+    a batching inpainter shares its forward passes across images. Tiles are
+    computed once per distinct mask object, e.g. for video frames that all
+    reuse one keyframe mask.
+    """
+    plans = {}
+    results, crops, crop_masks, owners = [], [], [], []
+    for i, (image, mask) in enumerate(zip(images, masks)):
+        if id(mask) not in plans:
+            tiles = mask_tiles(mask, padding=padding)
+            tile_area = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in tiles)
+            plans[id(mask)] = None if tile_area > max_area_ratio * mask.shape[0] * mask.shape[1] else tiles
+        tiles = plans[id(mask)]
+        results.append(None if tiles is None else image.copy())
+        if tiles is None:
+            crops.append(image)
+            crop_masks.append(mask)
+            owners.append((i, None))
+            continue
+        for x0, y0, x1, y1 in tiles:
+            crops.append(image[y0:y1, x0:x1])
+            crop_masks.append(mask[y0:y1, x0:x1])
+            owners.append((i, (x0, y0, x1, y1)))
+
+    inpainted = inpaint_fn(crops, crop_masks) if crops else []
+
+    # Blend back: only masked pixels change, everything else stays original
+    for (i, rect), tile, tile_mask in zip(owners, inpainted, crop_masks):
+        if rect is None:
+            results[i] = tile
+            continue
+        x0, y0, x1, y1 = rect
+        region = results[i][y0:y1, x0:x1]
+        region[tile_mask > 0] = tile[tile_mask > 0]
+    return results
@@ -0,0 +1,147 @@
+import json
+import queue
+import threading
+import time
+import uuid
+
+from metrics import METRICS, trace
+
+
+class Job:
+    """State of one submitted pipeline job."""
+
+    def __init__(self, job_id, func, args, kind='job', trace_id=None):
+        self.id = job_id
+        self.func = func
+        self.args = args
+        self.kind = kind
+        self.trace_id = trace_id or job_id
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.error_status = 500
+        self.trace = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        """Status payload reported to clients."""
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'trace_id': self.trace_id,
+            'error': self.error,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'stages': self.trace['stages'] if self.trace else None
+        }
+
+
+class JobQueue:
+    """
+    Bounded work queue drained by a fixed pool of worker threads.
+    `func(*args)` must return a (success, result_or_message) tuple, the same
+    convention the pipeline functions in app.py use; failures may add an
+    HTTP status as a third item (400 for unusable input, 500 by default).
+    Finished jobs are kept for `result_ttl` seconds so clients can fetch
+    their results. Every job runs under a metrics trace; `profile_rate` of
+    them are also profiled. Callers that hand a result out synchronously
+    discard() the job.
+    """
+
+    def __init__(self, num_workers=2, max_queue_size=16, result_ttl=600,
+                 profile_rate=0.0, profiler='cprofile', profile_dir=None):
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.profile_rate = profile_rate
+        self.profiler = profiler
+        self.profile_dir = profile_dir
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.result_ttl = result_ttl
+        self.workers = []
+        for i in range(num_workers):
+            worker = threading.Thread(target=self._worker, name=f'pipeline-worker-{i}', daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, func, *args, kind='job', trace_id=None):
+        """Queue a job and return it immediately. Raises queue.Full when the queue is at capacity."""
+        self._purge_expired()
+        job = Job(uuid.uuid4().hex, func, args, kind=kind, trace_id=trace_id)
+        with self.lock:
+            self.jobs[job.id] = job
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            with self.lock:
+                del self.jobs[job.id]
+            METRICS.inc('unmarkr_jobs_total', 'status', 'rejected')
+            raise
+        return job
+
+    def discard(self, job_id):
+        """Drop a job whose result has already been handed out."""
+        with self.lock:
+            self.jobs.pop(job_id, None)
+
+    def get(self, job_id):
+        """Return the job with this id, or None if unknown or expired."""
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def depth(self):
+        """Number of jobs waiting for a worker."""
+        return self.queue.qsize()
+
+    def _worker(self):
+        while True:
+            job = self.queue.get()
+            job.status = 'running'
+            job.started_at = time.time()
+            record = {'stages': [], 'profile': None}
+            # Errors from the trace/profiler itself fail the job rather than the worker thread
+            try:
+                with trace(job.trace_id, self.profile_rate, self.profiler, self.profile_dir,
+                           profile_name=job.id) as record:
+                    outcome = job.func(*job.args)
+                success, result = outcome[:2]
+                if len(outcome) > 2:
+                    job.error_status = outcome[2]
+            except Exception as e:
+                success, result = False, str(e)
+            if success:
+                job.status = 'done'
+                job.result = result
+            else:
+                job.status = 'failed'
+                job.error = result
+            job.args = None  # release the uploaded bytes
+            job.finished_at = time.time()
+            job.trace = record
+
+            METRICS.inc('unmarkr_jobs_total', 'status', job.status)
+            METRICS.request_duration.observe(job.kind, job.finished_at - job.started_at)
+            print(json.dumps({
+                'trace_id': job.trace_id,
+                'job_id': job.id,
+                'kind': job.kind,
+                'status': job.status,
+                'queued_seconds': round(job.started_at - job.submitted_at, 4),
+                'run_seconds': round(job.finished_at - job.started_at, 4),
+                'stages': record['stages'],
+                'profile': record['profile']
+            }))
+            job.done.set()
+            self.queue.task_done()
+            self._purge_expired()
+
+    def _purge_expired(self):
+        now = time.time()
+        with self.lock:
+            expired = [job_id for job_id, job in self.jobs.items()
+                       if job.finished_at is not None and now - job.finished_at > self.result_ttl]
+            for job_id in expired:
+                del self.jobs[job_id]
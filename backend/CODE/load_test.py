@@ -0,0 +1,350 @@
+"""
+Load generator and soak test for the Flask service. Worker threads post
+synthetic images to an endpoint in a closed loop while a sampler records,
+per interval, latency percentiles, error counts, job queue depth, server
+RSS and leftover workspace directories. A linear fit of RSS over the
+steady part of the run flags memory growth. By default the app runs
+in-process on the stub backend, so a soak needs no weights or network;
+`--url` drives a running server instead.
+"""
+import os
+import io
+import re
+import sys
+import json
+import time
+import random
+import tempfile
+import argparse
+import array
+import threading
+import urllib.error
+import urllib.request
+import uuid
+import numpy as np
+
+from synthetic_data import synthetic_image, encode_png
+
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+GAUGE_PATTERN = re.compile(r'^(unmarkr_job_queue_depth|unmarkr_process_rss_bytes) (\S+)$', re.MULTILINE)
+
+
+def parse_mix(value):
+    """'640x480:5:3,1920x1080:20:1' -> [(640, 480, 5 text lines, weight 3), (1920, 1080, 20, 1)]"""
+    mix = []
+    for item in value.split(','):
+        if not item:
+            continue
+        parts = item.split(':')
+        width, height = (int(v) for v in parts[0].lower().split('x'))
+        lines = int(parts[1]) if len(parts) > 1 else 5
+        weight = float(parts[2]) if len(parts) > 2 else 1.0
+        mix.append((width, height, lines, weight))
+    return mix
+
+
+def build_payloads(mix, variants, seed):
+    """PNG payloads for every mix entry, `variants` seeds each, and their sampling weights."""
+    payloads, weights = [], []
+    for width, height, lines, weight in mix:
+        for variant in range(variants):
+            payloads.append((f'{width}x{height}_{lines}', encode_png(synthetic_image(width, height, lines, seed + variant))))
+            weights.append(weight / variants)
+    return payloads, weights
+
+
+def percentiles(seconds):
+    """p50/p95/p99 in milliseconds, or None without samples."""
+    if not seconds:
+        return None
+    values = np.percentile(np.array(seconds), [50, 95, 99]) * 1000
+    return {'p50_ms': round(float(values[0]), 3), 'p95_ms': round(float(values[1]), 3),
+            'p99_ms': round(float(values[2]), 3)}
+
+
+def memory_growth(timeline, warmup_fraction, max_growth_mb):
+    """
+    Least-squares RSS slope over the samples after `warmup_fraction` of the
+    run; flagged when the fitted growth over that window exceeds `max_growth_mb`.
+    """
+    samples = [s for s in timeline if s['rss_bytes'] is not None]
+    steady = samples[int(len(samples) * warmup_fraction):]
+    if len(steady) < 3:
+        return {'samples': len(steady), 'slope_mb_per_min': None, 'growth_mb': None, 'flagged': False}
+    t = np.array([s['elapsed_s'] for s in steady])
+    rss = np.array([s['rss_bytes'] for s in steady]) / (1024.0 * 1024.0)
+    slope = float(np.polyfit(t, rss, 1)[0])  # MB per second
+    growth = slope * (t[-1] - t[0])
+    return {
+        'samples': len(steady),
+        'slope_mb_per_min': round(slope * 60, 3),
+        'growth_mb': round(growth, 3),
+        'rss_start_mb': round(float(rss[0]), 1),
+        'rss_end_mb': round(float(rss[-1]), 1),
+        'flagged': bool(growth > max_growth_mb)
+    }
+
+
+class InProcessTarget:
+    """The Flask app imported into this process; each thread gets its own test client."""
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def _client(self):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        return client
+
+    def post(self, path, payload, fields):
+        form = dict(fields, image=(io.BytesIO(payload), 'load.png'))
+        response = self._client().post(path, data=form, content_type='multipart/form-data')
+        response.get_data()  # drain streamed bodies, as a real client would
+        return response.status_code
+
+    def get(self, path):
+        return self._client().get(path).get_data(as_text=True)
+
+
+class HttpTarget:
+    """A running server at `base_url`."""
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def post(self, path, payload, fields):
+        boundary = uuid.uuid4().hex
+        body = io.BytesIO()
+        for name, value in fields.items():
+            body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode('utf-8'))
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="image"; filename="load.png"\r\n'
+                   f'Content-Type: image/png\r\n\r\n'.encode('utf-8'))
+        body.write(payload)
+        body.write(f'\r\n--{boundary}--\r\n'.encode('utf-8'))
+        request = urllib.request.Request(self.base_url + path, data=body.getvalue(), method='POST',
+                                         headers={'Content-Type': f'multipart/form-data; boundary={boundary}'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+    def get(self, path):
+        with urllib.request.urlopen(self.base_url + path, timeout=self.timeout) as response:
+            return response.read().decode('utf-8')
+
+
+class LoadGenerator:
+    """
+    `concurrency` threads posting weighted random payloads to `endpoint`
+    until `duration` seconds have passed, sampled every `sample_every` seconds.
+    """
+
+    def __init__(self, target, endpoint, payloads, weights, fields, concurrency=4, duration=60.0,
+                 sample_every=5.0, workspace_root=None, seed=0):
+        self.target = target
+        self.endpoint = endpoint
+        self.payloads = payloads
+        self.weights = weights
+        self.fields = fields
+        self.concurrency = concurrency
+        self.duration = duration
+        self.sample_every = sample_every
+        self.workspace_root = workspace_root or tempfile.gettempdir()
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.window = []  # (latency, status) since the last sample
+        # Whole-run totals kept compact, since in-process their memory shows up in the RSS being watched
+        self.statuses = {}
+        self.requests = {}  # image kind -> request count
+        self.latencies = {}  # image kind -> successful latencies, float32
+        self.stop = threading.Event()
+
+    def run(self):
+        """Drive the load; returns the per-interval timeline."""
+        start = time.time()
+        threads = [threading.Thread(target=self._worker, args=(i,), name=f'load-{i}', daemon=True)
+                   for i in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+
+        timeline = [self._sample(start)]
+        while time.time() - start < self.duration:
+            self.stop.wait(min(self.sample_every, max(0.0, self.duration - (time.time() - start))))
+            sample = self._sample(start)
+            timeline.append(sample)
+            latency = sample['latency'] or {}
+            print(f"{sample['elapsed_s']:7.1f}s  {sample['requests']:5d} req  {sample['errors']:3d} err  "
+                  f"p95 {latency.get('p95_ms', 0):8.1f} ms  queue {sample['queue_depth']}  "
+                  f"rss {(sample['rss_bytes'] or 0) / 1048576:7.1f} MB  temp {sample['workspace_dirs']}")
+
+        self.stop.set()
+        for thread in threads:
+            thread.join()
+        timeline.append(self._sample(start))
+        return timeline
+
+    def _worker(self, index):
+        rng = random.Random(self.seed + index)
+        while not self.stop.is_set():
+            kind, payload = rng.choices(self.payloads, weights=self.weights)[0]
+            started = time.perf_counter()
+            try:
+                status = self.target.post(self.endpoint, payload, self.fields)
+            except Exception as e:
+                status = type(e).__name__  # connection failures and timeouts
+            latency = time.perf_counter() - started
+            with self.lock:
+                self.window.append((latency, status))
+                self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+                self.requests[kind] = self.requests.get(kind, 0) + 1
+                if status == 200:
+                    self.latencies.setdefault(kind, array.array('f')).append(latency)
+
+    def _sample(self, start):
+        with self.lock:
+            window, self.window = self.window, []
+        gauges = {}
+        try:
+            gauges = {name: float(value) for name, value in GAUGE_PATTERN.findall(self.target.get('/metrics'))}
+        except Exception as e:
+            print(f"Could not read /metrics: {e}")
+        rss = gauges.get('unmarkr_process_rss_bytes')
+        queue_depth = gauges.get('unmarkr_job_queue_depth')
+        return {
+            'elapsed_s': round(time.time() - start, 2),
+            'requests': len(window),
+            'errors': sum(status != 200 for _, status in window),
+            'rejected': sum(status == 429 for _, status in window),
+            'latency': percentiles([latency for latency, status in window if status == 200]),
+            'queue_depth': int(queue_depth) if queue_depth is not None else None,
+            'rss_bytes': int(rss) if rss is not None else None,
+            'workspace_dirs': self._workspace_dirs()
+        }
+
+    def _workspace_dirs(self):
+        """Per-job workspaces (see app.job_workspace) currently on disk; a growing count means leaked temp files."""
+        try:
+            return sum(name.startswith('unmarkr_') for name in os.listdir(self.workspace_root))
+        except OSError:
+            return None
+
+    def summary(self):
+        """Totals, status counts and latency percentiles for the whole run, overall and per image kind."""
+        total = sum(self.requests.values())
+        ok = [latency for latencies in self.latencies.values() for latency in latencies]
+        return {
+            'requests': total,
+            'statuses': dict(self.statuses),
+            'error_rate': round((total - len(ok)) / total, 4) if total else None,
+            'throughput_per_s': round(len(ok) / self.duration, 3),
+            'latency': percentiles(ok),
+            'by_image': {kind: dict(percentiles(list(self.latencies.get(kind, ()))) or {}, requests=count)
+                         for kind, count in sorted(self.requests.items())}
+        }
+
+
+def main(args):
+    mix = parse_mix(args.mix)
+    payloads, weights = build_payloads(mix, args.variants, args.seed)
+    fields = {}
+    if args.quality:
+        fields['quality'] = args.quality
+    if args.stages:
+        fields['stages'] = args.stages
+
+    if args.url:
+        target = HttpTarget(args.url, args.timeout)
+    else:
+        # The app reads its configuration from the environment at import time
+        os.environ['UNMARKR_BACKEND'] = args.backend
+        os.environ['UNMARKR_BACKGROUND_LOAD'] = '0'  # models must be loaded before the load starts
+        if args.backend == 'stub':
+            os.environ.setdefault('UNMARKR_OCR_ENGINE', 'stub')
+        if not args.cache:
+            os.environ['UNMARKR_CACHE'] = '0'  # repeated images would otherwise be answered from the cache
+        sys.path.append(backend_dir)
+        os.chdir(backend_dir)
+        import app as server
+        target = InProcessTarget(server.app)
+
+    print(f"Driving {args.endpoint} with {args.concurrency} clients for {args.duration:.0f}s "
+          f"({len(payloads)} images, {'http ' + args.url if args.url else 'in-process ' + args.backend})")
+    generator = LoadGenerator(target, args.endpoint, payloads, weights, fields, concurrency=args.concurrency,
+                              duration=args.duration, sample_every=args.sample_every,
+                              workspace_root=args.workspace_root or os.environ.get('UNMARKR_WORKSPACE_ROOT'),
+                              seed=args.seed)
+    timeline = generator.run()
+    summary = generator.summary()
+    growth = memory_growth(timeline, args.warmup_fraction, args.max_growth_mb)
+    workspace_dirs = [s['workspace_dirs'] for s in timeline if s['workspace_dirs'] is not None]
+    leaked_dirs = workspace_dirs[-1] - workspace_dirs[0] if workspace_dirs else None
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'target': args.url or f'in-process:{args.backend}',
+            'endpoint': args.endpoint,
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'mix': args.mix,
+            'fields': fields,
+            'cpu_count': os.cpu_count()
+        },
+        'summary': summary,
+        'memory_growth': growth,
+        'leaked_workspace_dirs': leaked_dirs,
+        'timeline': timeline
+    }
+
+    latency = summary['latency'] or {}
+    print(f"{summary['requests']} requests, error rate {summary['error_rate']}, "
+          f"{summary['throughput_per_s']} ok/s, p50 {latency.get('p50_ms')} ms, p95 {latency.get('p95_ms')} ms, "
+          f"p99 {latency.get('p99_ms')} ms")
+    print(f"RSS slope {growth['slope_mb_per_min']} MB/min, growth {growth['growth_mb']} MB over the steady window"
+          + (" -- MEMORY GROWTH" if growth['flagged'] else ''))
+    if leaked_dirs:
+        print(f"{leaked_dirs} workspace directories were left behind")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Load test report saved to {args.output}")
+
+    # Non-zero exit so soak runs can gate a build
+    if growth['flagged'] or (leaked_dirs or 0) > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Drive the service with concurrent uploads and watch latency and memory over time")
+    parser.add_argument('--url', type=str, help='Base URL of a running server (default: run the app in-process)')
+    parser.add_argument('--backend', type=str, default='stub', choices=['stub', 'torch', 'torchscript', 'onnx'],
+                        help='Model backend of the in-process app; stub needs no downloaded weights')
+    parser.add_argument('--endpoint', type=str, default='/upload', help='Endpoint to post images to')
+    parser.add_argument('--mix', type=str, default='640x480:5:3,1280x720:10:2,1920x1080:20:1',
+                        help='Comma-separated WIDTHxHEIGHT:TEXT_LINES:WEIGHT image mix')
+    parser.add_argument('--variants', type=int, default=4, help='Differently seeded images per mix entry')
+    parser.add_argument('--quality', type=str, help='Inpainting quality field sent with each upload')
+    parser.add_argument('--stages', type=str, help='Pipeline stages field sent with each upload')
+    parser.add_argument('--concurrency', type=int, default=4, help='Concurrent clients')
+    parser.add_argument('--duration', type=float, default=60.0, help='Seconds to run')
+    parser.add_argument('--sample_every', type=float, default=5.0, help='Seconds between timeline samples')
+    parser.add_argument('--timeout', type=float, default=600.0, help='HTTP timeout per request with --url')
+    parser.add_argument('--cache', action='store_true', help='Keep the result cache of the in-process app enabled')
+    parser.add_argument('--workspace_root', type=str,
+                        help='Where the server creates job workspaces (default: UNMARKR_WORKSPACE_ROOT or the temp dir)')
+    parser.add_argument('--warmup_fraction', type=float, default=0.2,
+                        help='Leading fraction of samples left out of the memory growth fit')
+    parser.add_argument('--max_growth_mb', type=float, default=50.0,
+                        help='RSS growth over the steady window that is flagged as a leak')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic images and request order')
+    parser.add_argument('--output', type=str, help='Path to save the JSON report')
+
+    args = parser.parse_args()
+    main(args)
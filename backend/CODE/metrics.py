@@ -0,0 +1,253 @@
+import cProfile
+import os
+import random
+import resource
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+MEMORY_BUCKETS = tuple(mb * 1024 * 1024 for mb in (1, 4, 16, 64, 256, 1024, 4096))
+RSS_SAMPLE_INTERVAL = 0.005  # seconds between RSS samples while a stage is open
+
+
+def current_rss():
+    """Resident set size of this process in bytes."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return peak_rss()
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes."""
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if os.uname().sysname == 'Darwin' else maxrss * 1024
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram, one series per label value."""
+
+    def __init__(self, name, help_text, label, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        with self.lock:
+            counts, total = self.series.get(label_value, ([0] * len(self.buckets), [0, 0.0]))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            total[0] += 1
+            total[1] += value
+            self.series[label_value] = (counts, total)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            for label_value, (counts, (count, value_sum)) in sorted(self.series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{{{self.label}="{label_value}",le="{bound}"}} {bucket_count}')
+                lines.append(f'{self.name}_bucket{{{self.label}="{label_value}",le="+Inf"}} {count}')
+                lines.append(f'{self.name}_sum{{{self.label}="{label_value}"}} {value_sum}')
+                lines.append(f'{self.name}_count{{{self.label}="{label_value}"}} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    """Per-stage latency and memory histograms plus simple labelled counters."""
+
+    def __init__(self):
+        self.stage_duration = Histogram('unmarkr_stage_duration_seconds',
+                                        'Wall time spent in each pipeline stage.', 'stage', DURATION_BUCKETS)
+        self.stage_memory = Histogram('unmarkr_stage_peak_rss_growth_bytes',
+                                      'Peak process RSS above its value at stage start, sampled every '
+                                      f'{RSS_SAMPLE_INTERVAL * 1000:g} ms. RSS is process-wide, so this is '
+                                      'approximate while stages run concurrently.', 'stage', MEMORY_BUCKETS)
+        self.request_duration = Histogram('unmarkr_request_duration_seconds',
+                                          'End-to-end job processing time.', 'endpoint', DURATION_BUCKETS)
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def inc(self, name, label, label_value, amount=1):
+        with self.lock:
+            key = (name, label, label_value)
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def render(self, gauges=None, counters=None):
+        """Prometheus text exposition; `gauges`/`counters` map extra metric names to current values."""
+        lines = self.stage_duration.render() + self.stage_memory.render() + self.request_duration.render()
+        with self.lock:
+            labelled = sorted(self.counters.items())
+        seen = set()
+        for (name, label, label_value), value in labelled:
+            if name not in seen:
+                lines.append(f'# TYPE {name} counter')
+                seen.add(name)
+            lines.append(f'{name}{{{label}="{label_value}"}} {value}')
+        for kind, extra in (('gauge', gauges), ('counter', counters)):
+            for name, value in sorted((extra or {}).items()):
+                lines.append(f'# TYPE {name} {kind}')
+                lines.append(f'{name} {value}')
+        lines.append('# TYPE unmarkr_process_rss_bytes gauge')
+        lines.append(f'unmarkr_process_rss_bytes {current_rss()}')
+        lines.append('# TYPE unmarkr_process_peak_rss_bytes gauge')
+        lines.append(f'unmarkr_process_peak_rss_bytes {peak_rss()}')
+        return '\n'.join(lines) + '\n'
+
+
+class PeakRssSampler:
+    """
+    High-water mark of process RSS over open stages. A daemon thread samples
+    RSS every `interval` seconds while any stage is open, so short-lived
+    peaks inside a stage are seen, not just its start and end. RSS is
+    process-wide: stages running at the same time all see each other's peaks.
+    """
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self._reset()
+
+    def _reset(self):
+        self.lock = threading.Lock()
+        self.active = {}  # token -> highest RSS seen since the stage opened
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def open(self):
+        """Start tracking a stage; returns (token, RSS now)."""
+        rss = current_rss()
+        token = object()
+        with self.lock:
+            self.active[token] = rss
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+        return token, rss
+
+    def close(self, token):
+        """Stop tracking a stage; returns the highest RSS seen while it was open."""
+        rss = current_rss()
+        with self.lock:
+            return max(self.active.pop(token), rss)
+
+    def _run(self):
+        while True:
+            self.wakeup.wait()
+            rss = current_rss()
+            with self.lock:
+                if not self.active:
+                    self.wakeup.clear()
+                    continue
+                for token, peak in self.active.items():
+                    if rss > peak:
+                        self.active[token] = rss
+            time.sleep(self.interval)
+
+
+METRICS = MetricsRegistry()
+PEAK_RSS = PeakRssSampler()
+# Forked model workers start with a fresh sampler; the parent's thread does not survive the fork
+os.register_at_fork(after_in_child=PEAK_RSS._reset)
+_local = threading.local()
+
+
+@contextmanager
+def stage(name):
+    """Time a pipeline stage and its peak RSS growth, record them in METRICS and in the current trace, if any."""
+    token, rss_before = PEAK_RSS.open()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        peak_growth = max(0, PEAK_RSS.close(token) - rss_before)
+        METRICS.stage_duration.observe(name, seconds)
+        METRICS.stage_memory.observe(name, peak_growth)
+        trace = getattr(_local, 'trace', None)
+        if trace is not None:
+            trace['stages'].append({'stage': name, 'seconds': round(seconds, 4), 'peak_rss_growth_bytes': peak_growth})
+
+
+def record_stages(stages):
+    """Record stages timed in another process (see stage()) here and in the current trace, if any."""
+    trace = getattr(_local, 'trace', None)
+    for entry in stages:
+        METRICS.stage_duration.observe(entry['stage'], entry['seconds'])
+        METRICS.stage_memory.observe(entry['stage'], entry['peak_rss_growth_bytes'])
+        if trace is not None:
+            trace['stages'].append(entry)
+
+
+def in_current_trace(fn):
+    """Wrap `fn` so stages it times on a worker thread land in the calling thread's trace."""
+    record = getattr(_local, 'trace', None)
+
+    def run(*args, **kwargs):
+        _local.trace = record
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.trace = None
+    return run
+
+
+@contextmanager
+def trace(trace_id, profile_rate=0.0, profiler='cprofile', profile_dir=None, profile_name=None):
+    """
+    Collect the stages run by this thread under `trace_id`. A `profile_rate`
+    fraction of traces also runs under cProfile or the torch profiler and is
+    written to `profile_dir` as `profile_name` (a server-generated id; a new
+    uuid when not given), never a name derived from the client.
+    """
+    record = {'trace_id': trace_id, 'stages': [], 'profile': None}
+    _local.trace = record
+    sampled = profile_dir is not None and random.random() < profile_rate
+    try:
+        if sampled:
+            with _profiled(profile_name or uuid.uuid4().hex, profiler, profile_dir) as path:
+                record['profile'] = path
+                yield record
+        else:
+            yield record
+    finally:
+        _local.trace = None
+
+
+@contextmanager
+def _profiled(name, profiler, profile_dir):
+    """Profile the body into `profile_dir`; profiler failures are logged and never fail the job."""
+    try:
+        os.makedirs(profile_dir, exist_ok=True)
+    except OSError as e:
+        print(f"Profiling skipped, cannot create {profile_dir}: {e}")
+        yield None
+        return
+    if profiler == 'torch':
+        import torch
+        path = os.path.join(profile_dir, f'{name}.json')
+        with torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU], record_shapes=True) as prof:
+            yield path
+        try:
+            prof.export_chrome_trace(path)
+        except Exception as e:
+            print(f"Could not write profile {path}: {e}")
+    else:
+        path = os.path.join(profile_dir, f'{name}.prof')
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            yield path
+        finally:
+            prof.disable()
+            try:
+                prof.dump_stats(path)
+            except OSError as e:
+                print(f"Could not write profile {path}: {e}")
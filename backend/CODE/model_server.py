@@ -0,0 +1,176 @@
+"""
+Multi-process model serving. The parent loads the CRAFT and LaMa weights
+once, then forks worker processes that inherit them copy-on-write, so N
+workers cost roughly one copy of the weights instead of N. Each worker
+pins its torch/OpenCV thread pools so the workers together do not
+oversubscribe the node's cores.
+"""
+import functools
+import gc
+import multiprocessing
+import os
+import queue
+import threading
+
+from metrics import METRICS, trace, record_stages
+
+# TextRemovalPipeline methods that run in the worker processes
+PROXIED_METHODS = ('run', 'run_batch', 'detect', 'mask', 'removal_mask', 'detect_and_mask_batch',
+                   'inpaint', 'inpaint_batch', 'inpaint_delta', 'ocr')
+
+
+def default_threads(num_workers):
+    """Split the available cores evenly between the workers."""
+    return max(1, (os.cpu_count() or 1) // max(1, num_workers))
+
+
+def pin_threads(threads):
+    """Limit torch and OpenCV intra-op parallelism in this process."""
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    os.environ['MKL_NUM_THREADS'] = str(threads)
+    try:
+        import cv2
+        cv2.setNumThreads(threads)
+    except ImportError:
+        pass
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # already fixed once inter-op work has run
+
+
+def _serve(pipeline, conn, threads, warm_up=()):
+    """Worker loop: run pipeline methods received over `conn` until it closes."""
+    pin_threads(threads)
+    error = None
+    if warm_up:
+        try:
+            pipeline.warm_up(warm_up)
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+            print(f"Model worker warm-up failed: {error}")
+    conn.send(('ready', error))
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if message is None:
+            break
+        method, args = message
+        with trace(None) as record:
+            try:
+                reply = (True, getattr(pipeline, method)(*args))
+            except Exception as e:
+                reply = (False, f'{type(e).__name__}: {e}')
+        conn.send(reply + (record['stages'],))
+    conn.close()
+
+
+class ModelServerPool:
+    """
+    Forked worker processes sharing one loaded TextRemovalPipeline. Calls
+    block until a worker is free, so at most `num_workers` requests run
+    inference at once. Must be created before the app starts any threads.
+    Each worker runs `pipeline.warm_up(warm_up)` and reports ready before
+    it takes calls. Workers that die are not respawned (forking from the
+    now-threaded server is unsafe); ready() counts only live, ready workers.
+    """
+
+    def __init__(self, pipeline, num_workers=2, threads_per_worker=None, warm_up=()):
+        self.pipeline = pipeline
+        self.num_workers = num_workers
+        self.threads_per_worker = threads_per_worker or default_threads(num_workers)
+        self.idle = queue.Queue()
+        self.workers = []
+        self.ready_workers = set()
+
+        # Keep the collector from touching (and so copying) every inherited object page
+        gc.collect()
+        gc.freeze()
+        context = multiprocessing.get_context('fork')
+        for i in range(num_workers):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=_serve, args=(pipeline, child_conn, self.threads_per_worker, warm_up),
+                                      name=f'model-worker-{i}', daemon=True)
+            process.start()
+            child_conn.close()
+            self.workers.append((process, parent_conn))
+        gc.unfreeze()
+        print(f"Started {num_workers} model workers with {self.threads_per_worker} threads each")
+        threading.Thread(target=self._await_ready, name='model-workers-ready', daemon=True).start()
+
+    def _await_ready(self):
+        """Hand each worker out only once it has sent its ready message."""
+        for index, (process, conn) in enumerate(self.workers):
+            try:
+                while not conn.poll(1.0):
+                    if not process.is_alive():
+                        raise EOFError
+                _, error = conn.recv()
+            except (EOFError, OSError):
+                print(f"Model worker {index} exited with code {process.exitcode} before it was ready")
+                METRICS.inc('unmarkr_model_worker_exits_total', 'worker', index)
+                continue
+            if error is not None:
+                print(f"Model worker {index} is ready without warm-up ({error})")
+            self.ready_workers.add(index)
+            self.idle.put(index)
+
+    def call(self, method, *args):
+        """Run `pipeline.<method>(*args)` in a free worker and return its result."""
+        if method not in PROXIED_METHODS:
+            raise ValueError(f"Method not served by the worker pool: {method}")
+        while True:
+            try:
+                index = self.idle.get(timeout=1.0)
+                break
+            except queue.Empty:
+                if self.alive() == 0:
+                    raise RuntimeError('No model workers are running')
+        process, conn = self.workers[index]
+        try:
+            conn.send((method, args))
+            while not conn.poll(1.0):
+                if not process.is_alive():
+                    raise EOFError
+            success, result, stages = conn.recv()
+        except (EOFError, OSError):
+            # The worker is gone; leave it out of the idle set rather than forking from a threaded parent
+            print(f"Model worker {index} exited with code {process.exitcode}")
+            METRICS.inc('unmarkr_model_worker_exits_total', 'worker', index)
+            raise RuntimeError(f'Model worker {index} died while running {method}')
+        self.idle.put(index)
+
+        record_stages(stages)
+        if not success:
+            raise RuntimeError(result)
+        return result
+
+    def __getattr__(self, name):
+        if name in PROXIED_METHODS:
+            return functools.partial(self.call, name)
+        return getattr(self.pipeline, name)
+
+    def alive(self):
+        """Number of worker processes still running."""
+        return sum(process.is_alive() for process, _ in self.workers)
+
+    def ready(self):
+        """Number of worker processes that reported ready and are still running."""
+        return sum(self.workers[index][0].is_alive() for index in list(self.ready_workers))
+
+    def close(self):
+        """Ask every worker to exit and wait for them."""
+        for process, conn in self.workers:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for process, _ in self.workers:
+            process.join(timeout=5)
@@ -0,0 +1,424 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from drawMask import create_mask, dilate_mask, mask_from_scores
+from inpaint_utils import inpaint_regions, inpaint_regions_batch, inpaint_classical, INPAINT_TIERS
+from extract_text import process, OcrPool
+from resolution import working_scale, inpaint_scale, resize_to_scale, resize_mask, scale_boxes, composite
+from tiling import tile_grid, merge_tile_boxes
+from metrics import stage, in_current_trace
+from synthetic_data import synthetic_image
+
+# Per-request quality knob: a fixed tier, or 'auto' (classical for tiny masks, refined LaMa otherwise)
+QUALITY_LEVELS = ('auto',) + INPAINT_TIERS
+# Model backends: 'torch' runs CRAFT/LaMa eagerly, 'torchscript'/'onnx' run graphs exported by
+# export_models.py, 'stub' runs offline stand-ins (no weights needed)
+BACKENDS = ('torch', 'torchscript', 'onnx', 'stub')
+# Where the removal mask comes from: the detected boxes, or straight from the CRAFT score maps
+MASK_SOURCES = ('boxes', 'scores')
+# Backends whose LaMa only runs single-pass: 'refine' runs, and is reported, as 'fast'
+SINGLE_PASS_BACKENDS = ('torchscript', 'onnx')
+# Model-backed stages that can be loaded (and warmed up) independently
+MODEL_STAGES = ('detect', 'inpaint')
+# Stages a request can ask for, in pipeline order, and what each one needs run first.
+# Inpainting and OCR only share the boxes, so they run concurrently when both are requested.
+PIPELINE_STAGES = ('detect', 'mask', 'inpaint', 'ocr')
+STAGE_REQUIRES = {'detect': (), 'mask': ('detect',), 'inpaint': ('detect', 'mask'), 'ocr': ('detect',)}
+
+
+def required_stages(stages):
+    """The requested stages plus everything they depend on, in pipeline order."""
+    unknown = [name for name in stages if name not in STAGE_REQUIRES]
+    if unknown:
+        raise ValueError(f"Unknown pipeline stage: {unknown[0]}")
+    needed = set(stages)
+    for name in stages:
+        needed.update(STAGE_REQUIRES[name])
+    return tuple(name for name in PIPELINE_STAGES if name in needed)
+
+
+def load_backend(backend, model_stage, craft_int8=False):
+    """
+    Import the module implementing one model stage ('detect' or 'inpaint') of
+    a backend; `craft_int8` picks the quantized CRAFT export. Imports are
+    deferred to here so torch and the lama stack only load when needed.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown model backend: {backend}")
+    if model_stage not in MODEL_STAGES:
+        raise ValueError(f"Unknown model stage: {model_stage}")
+    if backend == 'stub':
+        import stub_models
+        return stub_models
+    if backend in ('torchscript', 'onnx'):
+        from compiled_models import CompiledBackend
+        return CompiledBackend(backend, craft_int8=craft_int8)
+    if model_stage == 'detect':
+        import craft_detector
+        return craft_detector
+    import inpaint_lama
+    return inpaint_lama
+
+
+class TextRemovalPipeline:
+    """
+    In-process text removal engine. The CRAFT and LaMa models are loaded once
+    and kept resident, and every stage runs directly on numpy arrays.
+    `backend` selects the model implementation (see BACKENDS). Images whose
+    longer side exceeds `working_max_side` are detected and inpainted at a
+    reduced working resolution and composited back at full resolution.
+    Images whose longer side exceeds `detect_tile_size` are instead detected
+    at full resolution over overlapping tiles, so detector memory follows
+    the tile size rather than the image size.
+    Only the `preload` stages are loaded up front; the others load on first use.
+    """
+
+    def __init__(self, craft_model_path, lama_model_path, radius=5, quality='refine', n_iters=5, max_scales=3,
+                 classical_max_ratio=0.002, max_batch_size=8, ocr_workers=1, ocr_engine='pytesseract',
+                 tile_inpainting=False, tile_padding=64, mask_source='boxes', backend='torch',
+                 working_max_side=0, min_text_height=12, craft_int8=False, detect_tile_size=0,
+                 detect_tile_overlap=128, detect_workers=1, preload=MODEL_STAGES):
+        if quality not in QUALITY_LEVELS:
+            raise ValueError(f"Unknown inpainting quality: {quality}")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown model backend: {backend}")
+        if mask_source not in MASK_SOURCES:
+            raise ValueError(f"Unknown mask source: {mask_source}")
+
+        self.backend = backend
+        self.craft_int8 = craft_int8
+        self.craft_model_path = craft_model_path
+        self.lama_model_path = lama_model_path
+        self.detector = self.craft_net = None
+        self.inpainter = self.lama_model = self.device = None
+        self.load_lock = threading.Lock()
+
+        self.detect_params = {
+            'text_threshold': 0.7,
+            'low_text': 0.4,
+            'link_threshold': 0.4,
+            'canvas_size': 1280,
+            'mag_ratio': 1.5
+        }
+        self.radius = radius
+        self.quality = quality
+        self.n_iters = n_iters
+        self.max_scales = max_scales
+        self.classical_max_ratio = classical_max_ratio
+        self.max_batch_size = max_batch_size
+        self.tile_inpainting = tile_inpainting
+        self.tile_padding = tile_padding
+        self.mask_source = mask_source
+        self.working_max_side = working_max_side
+        self.min_text_height = min_text_height
+        self.detect_tile_size = detect_tile_size
+        self.detect_tile_overlap = detect_tile_overlap
+        self.detect_pool = ThreadPoolExecutor(max_workers=detect_workers, thread_name_prefix='detect') \
+            if detect_workers > 1 else None
+        self.ocr_pool = OcrPool(workers=ocr_workers, engine=ocr_engine)
+        # Runs each image's OCR alongside the inpainting of its batch
+        self.ocr_runner = ThreadPoolExecutor(max_workers=max_batch_size, thread_name_prefix='ocr-run')
+        self.load(preload)
+
+    def load(self, stages=MODEL_STAGES):
+        """Load the models of the given stages ('detect', 'inpaint') that are not loaded yet."""
+        with self.load_lock:
+            if 'detect' in stages and self.detector is None:
+                with stage('load_detect'):
+                    detector = load_backend(self.backend, 'detect', self.craft_int8)
+                    self.craft_net = detector.load_craft_model(self.craft_model_path)
+                self.detector = detector
+            if 'inpaint' in stages and self.inpainter is None:
+                with stage('load_inpaint'):
+                    inpainter = load_backend(self.backend, 'inpaint', self.craft_int8)
+                    config_path = os.path.join(self.lama_model_path, 'config.yaml')
+                    checkpoint_path = os.path.join(self.lama_model_path, 'models', 'best.ckpt')
+                    print("Loading LaMa model from:", self.lama_model_path)
+                    self.lama_model, self.device = inpainter.load_lama_model(config_path, checkpoint_path)
+                self.inpainter = inpainter
+
+    def loaded(self, stages=MODEL_STAGES):
+        """Whether the models of all the given stages are loaded."""
+        return ('detect' not in stages or self.detector is not None) and \
+            ('inpaint' not in stages or self.inpainter is not None)
+
+    def warm_up(self, stages=MODEL_STAGES):
+        """Run the given stages once on a small synthetic image, so the first request skips one-off initialisation."""
+        image = synthetic_image(256, 256, num_lines=3)
+        mask = np.zeros(image.shape[:2], dtype=np.uint8)
+        mask[96:160, 64:192] = 255
+        with stage('warm_up'):
+            if 'detect' in stages:
+                self.detect_and_mask_batch([image])
+            if 'inpaint' in stages:
+                self._inpaint_tier(image, mask, 'fast')
+
+    def params(self, quality=None):
+        """Every setting that changes the pipeline output, e.g. for result cache keys."""
+        return {
+            'backend': self.backend,
+            'craft_int8': self.craft_int8,
+            'detect': self.detect_params,
+            'radius': self.radius,
+            'mask_source': self.mask_source,
+            'quality': quality or self.quality,
+            'n_iters': self.n_iters,
+            'max_scales': self.max_scales,
+            'classical_max_ratio': self.classical_max_ratio,
+            'tile_inpainting': self.tile_inpainting,
+            'tile_padding': self.tile_padding,
+            'working_max_side': self.working_max_side,
+            'min_text_height': self.min_text_height,
+            'detect_tile_size': self.detect_tile_size,
+            'detect_tile_overlap': self.detect_tile_overlap,
+            'ocr_engine': self.ocr_pool.engine
+        }
+
+    def detect(self, image):
+        """Detect text boxes in an RGB image; returns an (N, 4, 2) int32 box array."""
+        return self.detect_and_mask_batch([image], with_mask=False)[0][0]
+
+    def mask(self, image, boxes):
+        """Rasterize the detected boxes into a dilated binary mask."""
+        with stage('mask'):
+            return create_mask(image.shape, boxes, radius=self.radius)
+
+    def removal_mask(self, image):
+        """Dilated removal mask of an RGB image, for callers that do not need the boxes."""
+        return self.detect_and_mask_batch([image], with_boxes=False)[0][1]
+
+    def detect_and_mask_batch(self, images, with_mask=True, with_boxes=True):
+        """
+        One CRAFT pass per resized-shape bucket, then per image the box array
+        and (optionally) the removal mask built from `mask_source`. Tiled
+        images always build their mask from the merged boxes. `with_boxes`
+        (one flag, or one per image) False lets a mask built from the score
+        maps skip box extraction; the boxes of those images are then None.
+        """
+        tiled = [self.is_tiled(image) for image in images]
+        if isinstance(with_boxes, bool):
+            with_boxes = [with_boxes] * len(images)
+        scores = iter(self._forward([image for image, is_tiled in zip(images, tiled) if not is_tiled]))
+        results = []
+        for image, is_tiled, needs_boxes in zip(images, tiled, with_boxes):
+            if is_tiled:
+                boxes = self._detect_tiled(image)
+                results.append((boxes, self.mask(image, boxes) if with_mask else None))
+                continue
+            score_text, score_link, target_ratio = next(scores)
+            if with_mask and self.mask_source == 'scores' and not needs_boxes:
+                results.append((None, self._score_mask(image, score_text, score_link, target_ratio)))
+                continue
+            with stage('postprocess'):
+                boxes = self.detector.postprocess_scores(
+                    score_text, score_link, target_ratio, self.detect_params['text_threshold'],
+                    self.detect_params['low_text'], self.detect_params['link_threshold']
+                )
+            mask = None
+            if with_mask:
+                if self.mask_source == 'scores':
+                    mask = self._score_mask(image, score_text, score_link, target_ratio)
+                else:
+                    mask = self.mask(image, boxes)
+            results.append((boxes, mask))
+        return results
+
+    def is_tiled(self, image):
+        """Whether an image is large enough to be detected over tiles."""
+        return bool(self.detect_tile_size) and max(image.shape[:2]) > self.detect_tile_size
+
+    def _detect_tiled(self, image):
+        """CRAFT over overlapping full-resolution tiles; boxes cut or repeated at the seams are merged."""
+        tiles = tile_grid(image.shape, self.detect_tile_size, self.detect_tile_overlap)
+        chunks = [tiles[i:i + self.max_batch_size] for i in range(0, len(tiles), self.max_batch_size)]
+        if self.detect_pool is not None:
+            detect_tiles = in_current_trace(self._detect_tiles)
+            chunk_boxes = list(self.detect_pool.map(lambda chunk: detect_tiles(image, chunk), chunks))
+        else:
+            chunk_boxes = [self._detect_tiles(image, chunk) for chunk in chunks]
+        with stage('merge_tiles'):
+            return merge_tile_boxes([boxes for chunk in chunk_boxes for boxes in chunk], tiles, image.shape)
+
+    def _detect_tiles(self, image, tiles):
+        crops = [image[y0:y1, x0:x1] for x0, y0, x1, y1 in tiles]
+        tile_boxes = []
+        for (x0, y0, _, _), (score_text, score_link, target_ratio) in zip(tiles, self._forward(crops)):
+            with stage('postprocess'):
+                boxes = self.detector.postprocess_scores(
+                    score_text, score_link, target_ratio, self.detect_params['text_threshold'],
+                    self.detect_params['low_text'], self.detect_params['link_threshold']
+                )
+            tile_boxes.append(np.asarray(boxes, dtype=np.int32).reshape((-1, 4, 2)) + np.int32([x0, y0]))
+        return tile_boxes
+
+    def _forward(self, images):
+        if self.detector is None:
+            self.load(('detect',))
+        with stage('craft_forward'):
+            return self.detector.forward_batch(self.craft_net, images, self.detect_params['canvas_size'],
+                                               self.detect_params['mag_ratio'], self.max_batch_size)
+
+    def _score_mask(self, image, score_text, score_link, target_ratio):
+        with stage('mask'):
+            mask = mask_from_scores(score_text, score_link, target_ratio, image.shape,
+                                    self.detect_params['low_text'], self.detect_params['link_threshold'])
+            return dilate_mask(mask, self.radius)
+
+    def choose_tier(self, mask, quality=None):
+        """Pick the inpainting tier that will actually run for a mask; 'none' when there is nothing to fill."""
+        quality = quality or self.quality
+        if quality not in QUALITY_LEVELS:
+            raise ValueError(f"Unknown inpainting quality: {quality}")
+        masked = np.count_nonzero(mask)
+        if masked == 0:
+            return 'none'
+        if quality == 'auto':
+            quality = 'classical' if masked <= self.classical_max_ratio * mask.size else 'refine'
+        if quality == 'refine' and self.backend in SINGLE_PASS_BACKENDS:
+            return 'fast'
+        return quality
+
+    def inpaint(self, image, mask, quality=None):
+        """Fill the masked area of an RGB image; returns the RGB result and the tier that ran."""
+        tier = self.choose_tier(mask, quality)
+        with stage('inpaint'):
+            return self._inpaint_tier(image, mask, tier), tier
+
+    def inpaint_batch(self, images, masks, quality=None):
+        """
+        Inpaint several RGB images with one inpainter call per LaMa tier, so
+        the single-pass 'fast' tier shares forward passes across images (or,
+        with tile inpainting, across all their mask tiles) of the same shape.
+        Returns the results and tiers.
+        """
+        tiers = [self.choose_tier(mask, quality) for mask in masks]
+        cleaned = [None] * len(images)
+        with stage('inpaint'):
+            for tier in ('fast', 'refine'):
+                group = [i for i, t in enumerate(tiers) if t == tier]
+                if not group:
+                    continue
+                inpaint_fn = self._inpaint_fn(tier)
+                group_images, group_masks = [images[i] for i in group], [masks[i] for i in group]
+                if self.tile_inpainting:
+                    outputs = inpaint_regions_batch(group_images, group_masks, inpaint_fn, padding=self.tile_padding)
+                else:
+                    outputs = inpaint_fn(group_images, group_masks)
+                for i, output in zip(group, outputs):
+                    cleaned[i] = output
+            for i, tier in enumerate(tiers):
+                if cleaned[i] is None:
+                    cleaned[i] = self._inpaint_tier(images[i], masks[i], tier)
+        return cleaned, tiers
+
+    def inpaint_delta(self, image, mask, quality=None):
+        """
+        Fill only padded tiles around `mask` in an already-cleaned image, e.g.
+        a region a user added; returns the RGB result and the tier that ran.
+        """
+        tier = self.choose_tier(mask, quality)
+        with stage('inpaint'):
+            if tier == 'none':
+                return image.copy(), tier
+            return inpaint_regions(image, mask, self._inpaint_fn(tier), padding=self.tile_padding,
+                                   max_area_ratio=1.0), tier
+
+    def _inpaint_fn(self, tier):
+        if tier == 'classical':
+            return lambda images, masks: [inpaint_classical(image, mask) for image, mask in zip(images, masks)]
+        if self.inpainter is None:
+            self.load(('inpaint',))
+
+        def inpaint_fn(images, masks):
+            return self.inpainter.inpaint_images(images, masks, self.lama_model, self.device,
+                                                 refine=tier == 'refine', n_iters=self.n_iters,
+                                                 max_scales=self.max_scales, max_batch_size=self.max_batch_size)
+        return inpaint_fn
+
+    def _inpaint_tier(self, image, mask, tier):
+        if tier == 'none':
+            return image.copy()
+        if tier == 'classical':
+            return inpaint_classical(image, mask)
+
+        inpaint_fn = self._inpaint_fn(tier)
+        if self.tile_inpainting:
+            return inpaint_regions(image, mask, inpaint_fn, padding=self.tile_padding)
+        return inpaint_fn([image], [mask])[0]
+
+    def ocr(self, image, boxes):
+        """Read the text inside every box; returns the `text_coordinates` payload."""
+        flat_boxes = np.asarray(boxes).reshape(-1, 8).tolist()
+        with stage('ocr'):
+            results = process(image[:, :, ::-1], flat_boxes, ocr_pool=self.ocr_pool)  # RGB to BGR
+        return [{'coordinates': box, 'text': text} for box, text in results]
+
+    def run(self, image, quality=None, stages=PIPELINE_STAGES):
+        """Run detection, masking, inpainting and OCR (or only the given `stages`) on an RGB image."""
+        return self.run_batch([image], quality, stages=stages)[0]
+
+    def run_batch(self, images, quality=None, with_ocr=True, stages=PIPELINE_STAGES):
+        """
+        Run the pipeline on several RGB images, sharing CRAFT (and, for the
+        single-pass 'fast' tier, LaMa) forward passes across images of the same shape.
+        Only `stages` and the stages they need run (see STAGE_REQUIRES); the
+        result keys of skipped stages are None. With mask_source='scores' and
+        no 'ocr' stage, full-resolution images skip box extraction and their
+        'boxes' are None. With `with_ocr=False`,
+        'text_coordinates' is None and callers run ocr() themselves.
+        """
+        stages = required_stages(stages)
+        # With score-map masks, removal alone needs no boxes; OCR (even when the caller runs it) and
+        # downscaled images, whose text height sets the inpainting scale, still do
+        box_free = self.mask_source == 'scores' and 'mask' in stages and 'ocr' not in stages
+        if not with_ocr:
+            stages = tuple(name for name in stages if name != 'ocr')
+        with stage('downscale'):
+            scales = [working_scale(image.shape, self.working_max_side) for image in images]
+            working = [resize_to_scale(image, scale) for image, scale in zip(images, scales)]
+        # Tiled images are detected at full resolution, the others at the working scale
+        detect_scales = [1.0 if self.is_tiled(image) else scale for image, scale in zip(images, scales)]
+        detections = self.detect_and_mask_batch([image if detect_scale == 1.0 else working[i]
+                                                 for i, (image, detect_scale) in enumerate(zip(images, detect_scales))],
+                                                with_mask='mask' in stages,
+                                                with_boxes=[not box_free or scale < 1.0 for scale in scales])
+        all_boxes = [None if boxes is None else scale_boxes(boxes, 1.0 / detect_scale)
+                     for (boxes, _), detect_scale in zip(detections, detect_scales)]
+
+        # OCR only needs the boxes, so it runs while the batch is inpainted
+        ocr = in_current_trace(self.ocr)
+        text_coordinates = [self.ocr_runner.submit(ocr, image, boxes) if 'ocr' in stages else None
+                            for image, boxes in zip(images, all_boxes)]
+
+        masks = [mask for _, mask in detections]
+        cleaned, tiers = [None] * len(images), [None] * len(images)
+        if 'inpaint' in stages:
+            # Small text is inpainted at a higher resolution than the working scale
+            with stage('downscale'):
+                for i, boxes in enumerate(all_boxes):
+                    scale = scales[i] if boxes is None else inpaint_scale(scales[i], boxes, self.min_text_height)
+                    if scale > scales[i]:
+                        working[i] = resize_to_scale(images[i], scale)
+                    masks[i] = resize_mask(masks[i], working[i].shape)
+            cleaned, tiers = self.inpaint_batch(working, masks, quality)
+
+        # Only the masked pixels of the full-resolution original are replaced
+        if 'mask' in stages:
+            with stage('composite'):
+                for i, image in enumerate(images):
+                    masks[i] = resize_mask(masks[i], image.shape)
+                    if cleaned[i] is not None and working[i] is not image:
+                        cleaned[i] = composite(image, cleaned[i], masks[i])
+
+        return [
+            {
+                'boxes': boxes,
+                'mask': mask,
+                'cleaned_image': cleaned_image,
+                'inpaint_tier': tier,
+                'text_coordinates': future.result() if future is not None else None
+            }
+            for boxes, mask, cleaned_image, tier, future in zip(all_boxes, masks, cleaned, tiers, text_coordinates)
+        ]
@@ -0,0 +1,85 @@
+import cv2
+import numpy as np
+
+from inpaint_utils import mask_tiles
+
+
+def working_scale(shape, max_side):
+    """Downscale factor (<= 1) that fits the longer image side into `max_side`; 0 disables downscaling."""
+    longest = max(shape[:2])
+    if not max_side or longest <= max_side:
+        return 1.0
+    return max_side / float(longest)
+
+
+def text_height(boxes):
+    """Median short side of the (N, 4, 2) text boxes, or None when there are none."""
+    if len(boxes) == 0:
+        return None
+    boxes = np.asarray(boxes, dtype=np.float32)
+    side_a = np.linalg.norm(boxes[:, 1] - boxes[:, 0], axis=1)
+    side_b = np.linalg.norm(boxes[:, 2] - boxes[:, 1], axis=1)
+    return float(np.median(np.minimum(side_a, side_b)))
+
+
+def inpaint_scale(scale, boxes, min_text_height):
+    """
+    Inpainting scale for an image with working `scale` and full-resolution
+    text `boxes`: raised (up to full resolution) when the text would
+    otherwise be shorter than `min_text_height` pixels, since LaMa smears
+    strokes it cannot resolve.
+    """
+    height = text_height(boxes)
+    if scale >= 1.0 or height is None or height <= 0:
+        return scale
+    return min(1.0, max(scale, min_text_height / height))
+
+
+def resize_to_scale(image, scale, interpolation=cv2.INTER_AREA):
+    """Resize by `scale`; returns the input unchanged at scale 1."""
+    if scale >= 1.0:
+        return image
+    h, w = image.shape[:2]
+    size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+    return cv2.resize(image, size, interpolation=interpolation)
+
+
+def resize_mask(mask, shape):
+    """Resize a binary mask to `shape`, keeping it binary."""
+    if mask.shape[:2] == tuple(shape[:2]):
+        return mask
+    resized = cv2.resize(mask, (shape[1], shape[0]), interpolation=cv2.INTER_LINEAR)
+    return np.where(resized > 127, 255, 0).astype(np.uint8)
+
+
+def scale_boxes(boxes, factor):
+    """Scale (N, 4, 2) box coordinates by `factor`; returns int32 boxes."""
+    if factor == 1.0:
+        return boxes
+    return np.round(np.asarray(boxes, dtype=np.float32) * factor).astype(np.int32)
+
+
+def composite(original, inpainted, mask):
+    """
+    Paste the masked pixels of a lower-resolution `inpainted` image into the
+    full-resolution `original`. `mask` is the full-resolution mask; only
+    tiles around it are upsampled, so the cost follows the text area and
+    every unmasked pixel stays untouched.
+    """
+    h, w = original.shape[:2]
+    if inpainted.shape[:2] == (h, w):
+        result = original.copy()
+        result[mask > 0] = inpainted[mask > 0]
+        return result
+
+    sx = inpainted.shape[1] / float(w)
+    sy = inpainted.shape[0] / float(h)
+    result = original.copy()
+    for x0, y0, x1, y1 in mask_tiles(mask, padding=2, min_size=0):
+        # Same pixel-centre mapping as cv2.resize, restricted to this tile
+        matrix = np.float32([[sx, 0, (x0 + 0.5) * sx - 0.5], [0, sy, (y0 + 0.5) * sy - 0.5]])
+        tile = cv2.warpAffine(inpainted, matrix, (x1 - x0, y1 - y0),
+                              flags=cv2.INTER_CUBIC | cv2.WARP_INVERSE_MAP, borderMode=cv2.BORDER_REPLICATE)
+        tile_mask = mask[y0:y1, x0:x1] > 0
+        result[y0:y1, x0:x1][tile_mask] = tile[tile_mask]
+    return result
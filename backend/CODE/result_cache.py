@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+DISK_LOW_WATER = 0.9  # fraction of max_disk_bytes the disk tier is trimmed to once it overflows
+
+
+def cache_key(image, params):
+    """Content hash of a decoded image plus the pipeline parameters that affect its result."""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(str(image.shape).encode('utf-8'))
+    digest.update(image.tobytes())
+    digest.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier cache of pipeline results keyed by `cache_key`. A result is the
+    dict returned to clients: encoded 'cleaned_image' bytes, 'text_coordinates',
+    'width' and 'height'. The memory tier is an LRU bounded by bytes; the
+    optional disk tier stores <key>.jpg / <key>.json pairs and evicts the least
+    recently used entries once `max_disk_bytes` is exceeded. Its size is kept
+    as a running count; the directory is only scanned at start-up and when
+    that count goes over the limit, and then trimmed to DISK_LOW_WATER of it
+    so a full cache is not rescanned on every write.
+    """
+
+    def __init__(self, max_memory_bytes=256 * 1024 * 1024, disk_dir=None, max_disk_bytes=2 * 1024 * 1024 * 1024):
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+        self.disk_bytes = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_evict()
+
+    def get(self, key):
+        """Return the cached result for `key`, or None on a miss."""
+        with self.lock:
+            result = self.memory.get(key)
+            if result is not None:
+                self.memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return result
+
+        result = self._disk_get(key)
+        with self.lock:
+            if result is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['disk_hits'] += 1
+            self._memory_put(key, result)
+        return result
+
+    def put(self, key, result):
+        """Store a result in both tiers."""
+        with self.lock:
+            self._memory_put(key, result)
+        self._disk_put(key, result)
+
+    def get_stats(self):
+        """Hit/miss counters and current tier sizes."""
+        with self.lock:
+            stats = dict(self.stats)
+            stats['memory_entries'] = len(self.memory)
+            stats['memory_bytes'] = self.memory_bytes
+            stats['disk_bytes'] = self.disk_bytes
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
+
+    def _entry_size(self, result):
+        return len(result['cleaned_image']) + len(json.dumps(result['text_coordinates']))
+
+    def _memory_put(self, key, result):
+        size = self._entry_size(result)
+        if size > self.max_memory_bytes:
+            return
+        if key in self.memory:
+            self.memory_bytes -= self._entry_size(self.memory.pop(key))
+        self.memory[key] = result
+        self.memory_bytes += size
+        while self.memory_bytes > self.max_memory_bytes:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= self._entry_size(evicted)
+            self.stats['evictions'] += 1
+
+    def _disk_paths(self, key):
+        return os.path.join(self.disk_dir, key + '.jpg'), os.path.join(self.disk_dir, key + '.json')
+
+    def _disk_get(self, key):
+        if not self.disk_dir:
+            return None
+        image_path, meta_path = self._disk_paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+            with open(image_path, 'rb') as f:
+                result['cleaned_image'] = f.read()
+            # Touch the entry so disk eviction follows recent use
+            os.utime(meta_path)
+        except (OSError, ValueError):
+            return None  # missing, partial, or evicted while we read it
+        return result
+
+    def _disk_put(self, key, result):
+        if not self.disk_dir:
+            return
+        image_path, meta_path = self._disk_paths(key)
+        meta = json.dumps({k: v for k, v in result.items() if k != 'cleaned_image'})
+        replaced = self._disk_size(key)
+        try:
+            # Write to temp names first so readers never see a partial entry
+            with open(image_path + '.tmp', 'wb') as f:
+                f.write(result['cleaned_image'])
+            with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(meta)
+            os.replace(image_path + '.tmp', image_path)
+            os.replace(meta_path + '.tmp', meta_path)
+        except OSError as e:
+            print(f"Error writing cache entry {key}: {e}")
+            return
+        with self.lock:
+            self.disk_bytes += len(result['cleaned_image']) + len(meta.encode('utf-8')) - replaced
+            over = self.disk_bytes > self.max_disk_bytes
+        if over:
+            self._disk_evict()
+
+    def _disk_size(self, key):
+        """Bytes an entry takes on disk, 0 when it is not there."""
+        try:
+            return sum(os.path.getsize(path) for path in self._disk_paths(key))
+        except OSError:
+            return 0
+
+    def _disk_evict(self):
+        """Rescan the disk tier, drop least recently used entries down to the low-water mark and resync the size count."""
+        entries = []
+        total = 0
+        for filename in os.listdir(self.disk_dir):
+            if not filename.endswith('.json'):
+                continue
+            key = filename[:-len('.json')]
+            image_path, meta_path = self._disk_paths(key)
+            try:
+                size = os.path.getsize(image_path) + os.path.getsize(meta_path)
+                entries.append((os.path.getmtime(meta_path), size, key))
+            except OSError:
+                continue
+            total += size
+
+        entries.sort()
+        target = DISK_LOW_WATER * self.max_disk_bytes if total > self.max_disk_bytes else total
+        for _, size, key in entries:
+            if total <= target:
+                break
+            for path in self._disk_paths(key):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            total -= size
+            with self.lock:
+                self.stats['evictions'] += 1
+        with self.lock:
+            self.disk_bytes = total
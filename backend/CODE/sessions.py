@@ -0,0 +1,113 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+from drawMask import polygon_mask
+
+
+class EditSession:
+    """
+    Pipeline state kept between interactive edits of one image: the original,
+    the current removal mask, the current cleaned image and the text found.
+    """
+
+    def __init__(self, session_id, image, result, quality=None):
+        self.id = session_id
+        self.image = image
+        self.mask = result['mask'] > 0
+        self.cleaned = result['cleaned_image']
+        self.text_coordinates = result['text_coordinates']
+        self.inpaint_tier = result['inpaint_tier']
+        self.quality = quality
+        self.edits = 0
+        self.last_used = time.time()
+        self.lock = threading.Lock()
+
+    def apply_edits(self, pipeline, add=(), remove=(), quality=None):
+        """
+        Apply polygon deltas. Removed polygons get their original pixels back
+        and leave the mask; added polygons are inpainted in padded tiles around
+        the new pixels only, on top of the current result.
+        """
+        with self.lock:
+            if remove:
+                removed = polygon_mask(self.image.shape, remove, pipeline.radius) > 0
+                restore = removed & self.mask
+                self.cleaned = self.cleaned.copy()
+                self.cleaned[restore] = self.image[restore]
+                self.mask &= ~removed
+                self.text_coordinates = [item for item in self.text_coordinates
+                                         if not removed[_centre(item['coordinates'], removed.shape)]]
+
+            tier = 'none'
+            if add:
+                added = (polygon_mask(self.image.shape, add, pipeline.radius) > 0) & ~self.mask
+                delta = added.astype(np.uint8) * 255
+                self.cleaned, tier = pipeline.inpaint_delta(self.cleaned, delta, quality or self.quality)
+                self.mask |= added
+
+                # Four-point regions are read like detected boxes
+                quads = [polygon for polygon in add if len(polygon) == 8]
+                if quads:
+                    self.text_coordinates = self.text_coordinates + pipeline.ocr(
+                        self.image, np.asarray(quads, dtype=np.int32).reshape((-1, 4, 2)))
+
+            self.inpaint_tier = tier
+            self.edits += 1
+            self.last_used = time.time()
+            return self.cleaned, self.text_coordinates, tier
+
+
+def _centre(coordinates, shape):
+    points = np.asarray(coordinates, dtype=np.float32).reshape((-1, 2))
+    x, y = points.mean(axis=0)
+    return min(max(int(y), 0), shape[0] - 1), min(max(int(x), 0), shape[1] - 1)
+
+
+class SessionStore:
+    """
+    In-memory edit sessions, evicted least recently used beyond
+    `max_sessions` and dropped after `ttl` seconds without an edit.
+    """
+
+    def __init__(self, max_sessions=16, ttl=1800):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def create(self, image, result, quality=None):
+        """Start a session from a full pipeline result (TextRemovalPipeline.run output)."""
+        session = EditSession(uuid.uuid4().hex, image, result, quality)
+        with self.lock:
+            self._purge_expired()
+            self.sessions[session.id] = session
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id):
+        """Return the session with this id, or None if unknown or expired."""
+        with self.lock:
+            self._purge_expired()
+            session = self.sessions.get(session_id)
+            if session is not None:
+                self.sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id):
+        """Drop a session; returns whether it existed."""
+        with self.lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def _purge_expired(self):
+        now = time.time()
+        expired = [session_id for session_id, session in self.sessions.items() if now - session.last_used > self.ttl]
+        for session_id in expired:
+            del self.sessions[session_id]
@@ -0,0 +1,80 @@
+"""
+Stand-ins for the CRAFT and LaMa backends that need neither torch, the
+CRAFT/lama checkouts nor downloaded weights. They expose the same functions
+TextRemovalPipeline calls on craft_detector and inpaint_lama, so benchmarks
+and load tests can exercise the whole service offline. Results are only
+roughly text-like and are not meant to be looked at.
+"""
+import cv2
+import numpy as np
+
+from inpaint_utils import inpaint_classical
+
+
+def load_craft_model(model_path):
+    """No weights to load; the stub detector is stateless."""
+    print("Using stub CRAFT model")
+    return None
+
+
+def load_lama_model(config_path, checkpoint_path, device='cpu'):
+    """No weights to load; the stub inpainter is stateless."""
+    print("Using stub LaMa model")
+    return None, device
+
+
+def _score_maps(image, canvas_size, mag_ratio):
+    # Same resize policy as CRAFT's imgproc.resize_aspect_ratio
+    h, w = image.shape[:2]
+    target_size = min(mag_ratio * max(h, w), canvas_size)
+    target_ratio = target_size / max(h, w)
+    target_h, target_w = int(h * target_ratio), int(w * target_ratio)
+
+    # Score maps are half the resized image, padded to a multiple of 32
+    half_h, half_w = max(target_h // 2, 1), max(target_w // 2, 1)
+    gray = cv2.cvtColor(cv2.resize(image, (half_w, half_h), interpolation=cv2.INTER_AREA), cv2.COLOR_RGB2GRAY)
+
+    # Local contrast stands in for the character region score
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (9, 9))
+    contrast = cv2.morphologyEx(gray, cv2.MORPH_TOPHAT, kernel).astype(np.float32)
+    contrast += cv2.morphologyEx(gray, cv2.MORPH_BLACKHAT, kernel)
+    score_text = np.clip(contrast * (4.0 / 255.0), 0.0, 1.0)
+    score_link = cv2.dilate(score_text, cv2.getStructuringElement(cv2.MORPH_RECT, (7, 3))) * 0.9
+
+    pad_h = (target_h + 31) // 32 * 16
+    pad_w = (target_w + 31) // 32 * 16
+    text_map = np.zeros((pad_h, pad_w), dtype=np.float32)
+    link_map = np.zeros((pad_h, pad_w), dtype=np.float32)
+    text_map[:half_h, :half_w] = score_text
+    link_map[:half_h, :half_w] = score_link
+    return text_map, link_map, target_ratio
+
+
+def forward_batch(net, images, canvas_size=1280, mag_ratio=1.5, max_batch_size=8):
+    """Heuristic (score_text, score_link, target_ratio) per image, like craft_detector.forward_batch."""
+    return [_score_maps(image, canvas_size, mag_ratio) for image in images]
+
+
+def postprocess_scores(score_text, score_link, target_ratio, text_threshold=0.7, low_text=0.4, link_threshold=0.4):
+    """Rotated rectangles around linked text components; returns an (N, 4, 2) int32 array."""
+    text_map = ((score_text > low_text) | (score_link > link_threshold)).astype(np.uint8)
+    num, labels, stats, _ = cv2.connectedComponentsWithStats(text_map, connectivity=4)
+
+    boxes = []
+    for label in range(1, num):
+        if stats[label, cv2.CC_STAT_AREA] < 10:
+            continue
+        component = labels == label
+        if score_text[component].max() < text_threshold:
+            continue
+        ys, xs = np.nonzero(component)
+        rect = cv2.minAreaRect(np.stack([xs, ys], axis=1).astype(np.float32))
+        boxes.append(cv2.boxPoints(rect) * (2.0 / target_ratio))
+    if not boxes:
+        return np.zeros((0, 4, 2), dtype=np.int32)
+    return np.array(boxes, dtype=np.float32).astype(np.int32)
+
+
+def inpaint_images(images, masks, model, device, refine=True, n_iters=5, max_scales=3, max_batch_size=4):
+    """OpenCV inpainting in place of every LaMa tier."""
+    return [inpaint_classical(image, mask) for image, mask in zip(images, masks)]
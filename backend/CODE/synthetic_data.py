@@ -0,0 +1,39 @@
+import cv2
+import numpy as np
+
+WORDS = ['SALE', 'open', 'Poster', 'meme', 'UnMarkr', 'text', 'removal', '50% OFF', 'hello', 'world',
+         'Concert', 'tonight', 'free', 'entry', 'caption', 'lorem', 'ipsum', '2024', 'Summer', 'fest']
+
+
+def synthetic_image(width, height, num_lines=5, seed=0):
+    """
+    Deterministic RGB test image: a noisy gradient background with
+    `num_lines` lines of random words drawn at random positions and sizes.
+    """
+    rng = np.random.default_rng(seed)
+
+    # Smooth two-colour gradient with a little noise, so inpainting has texture to match
+    start, end = rng.integers(0, 256, 3), rng.integers(0, 256, 3)
+    ramp = np.linspace(0.0, 1.0, width, dtype=np.float32)[None, :, None]
+    image = start + (end - start) * ramp
+    image = np.broadcast_to(image, (height, width, 3)) + rng.normal(0, 6, (height, width, 3))
+    image = np.clip(image, 0, 255).astype(np.uint8)
+
+    for _ in range(num_lines):
+        text = ' '.join(rng.choice(WORDS, size=rng.integers(1, 4)))
+        scale = max(0.4, rng.uniform(0.02, 0.06) * height / 22.0)
+        thickness = max(1, int(scale * 2))
+        (text_w, text_h), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, thickness)
+        x = int(rng.integers(0, max(1, width - text_w)))
+        y = int(rng.integers(text_h, max(text_h + 1, height)))
+        color = tuple(int(c) for c in 255 - image[min(y, height - 1), min(x, width - 1)])
+        cv2.putText(image, text, (x, y), cv2.FONT_HERSHEY_SIMPLEX, scale, color, thickness, cv2.LINE_AA)
+    return image
+
+
+def encode_png(image):
+    """Encode an RGB image as PNG bytes, the way a client would upload it."""
+    success, buffer = cv2.imencode('.png', image[:, :, ::-1])
+    if not success:
+        raise ValueError('Could not encode synthetic image')
+    return buffer.tobytes()
@@ -0,0 +1,80 @@
+import cv2
+import numpy as np
+
+
+def _starts(length, tile, overlap):
+    if length <= tile:
+        return [0]
+    step = max(1, tile - overlap)
+    return list(range(0, length - tile, step)) + [length - tile]
+
+
+def tile_grid(shape, tile_size, overlap):
+    """
+    Overlapping (x0, y0, x1, y1) tiles covering an image. Every tile has the
+    same size (the last row/column is shifted back to the edge), so tiles
+    stack into shared detector batches.
+    """
+    h, w = shape[:2]
+    return [(x, y, min(x + tile_size, w), min(y + tile_size, h))
+            for y in _starts(h, tile_size, overlap) for x in _starts(w, tile_size, overlap)]
+
+
+def merge_tile_boxes(tile_boxes, tiles, shape, min_overlap=0.2):
+    """
+    Merge per-tile (N, 4, 2) box arrays, already in image coordinates, into
+    one array. Only boxes that reach into another tile can be duplicated or
+    cut at a seam; those from different tiles whose bounding rectangles
+    overlap by `min_overlap` of the smaller one are replaced by one rotated
+    rectangle around all their points.
+    """
+    boxes = [b for b in tile_boxes if len(b)]
+    if not boxes:
+        return np.zeros((0, 4, 2), dtype=np.int32)
+    owners = np.concatenate([np.full(len(b), i) for i, b in enumerate(tile_boxes) if len(b)])
+    boxes = np.concatenate(boxes).astype(np.int32)
+
+    lo, hi = boxes.min(axis=1), boxes.max(axis=1)
+    tiles = np.asarray(tiles)
+    # Boxes intersecting more than one tile sit on a seam
+    touching = (lo[:, None, 0] < tiles[None, :, 2]) & (hi[:, None, 0] > tiles[None, :, 0]) & \
+               (lo[:, None, 1] < tiles[None, :, 3]) & (hi[:, None, 1] > tiles[None, :, 1])
+    seam = np.flatnonzero(touching.sum(axis=1) > 1)
+    if len(seam) < 2:
+        return boxes
+
+    s_lo, s_hi = lo[seam], hi[seam]
+    inter = np.clip(np.minimum(s_hi[:, None], s_hi[None]) - np.maximum(s_lo[:, None], s_lo[None]), 0, None).prod(-1)
+    area = np.maximum((s_hi - s_lo).prod(-1), 1)
+    linked = (inter >= min_overlap * np.minimum(area[:, None], area[None])) & \
+             (owners[seam][:, None] != owners[seam][None])
+
+    # Union-find over linked seam boxes
+    parent = list(range(len(seam)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b in zip(*np.nonzero(np.triu(linked, 1))):
+        parent[find(a)] = find(b)
+
+    groups = {}
+    for i in range(len(seam)):
+        groups.setdefault(find(i), []).append(seam[i])
+
+    h, w = shape[:2]
+    keep = np.ones(len(boxes), dtype=bool)
+    merged = []
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        keep[members] = False
+        points = boxes[members].reshape(-1, 2).astype(np.float32)
+        rect = cv2.boxPoints(cv2.minAreaRect(points))
+        merged.append(np.clip(np.round(rect), 0, [w - 1, h - 1]))
+    if not merged:
+        return boxes
+    return np.concatenate([boxes[keep], np.array(merged, dtype=np.int32)])
@@ -1,93 +1,197 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
 import os
 import base64
-import subprocess
 import sys
-import shutil
+from contextlib import contextmanager
 
+import cv2
+import numpy as np
 from PIL import Image
 import io
 import json
+import queue
+import threading
+import time
 import tempfile
+import uuid
+import mimetypes
+import re
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, 'CODE'))
+
+from pipeline import TextRemovalPipeline, QUALITY_LEVELS, MODEL_STAGES, PIPELINE_STAGES, MASK_SOURCES, required_stages
+from job_queue import JobQueue
+from result_cache import ResultCache, cache_key
+from metrics import METRICS, stage, in_current_trace
+from model_server import ModelServerPool
+from sessions import SessionStore
+from animation import gif_frames, video_frames, remove_text_frames, encode_gif, encode_video
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
 # Configuration
-INPUT_IMG_FOLDER = 'INPUT/IMG'
-INPUT_TXT_FOLDER = 'INPUT/TXT'
-INPUT_MASK_FOLDER = 'INPUT/MASK'
-OUTPUT_IMG_FOLDER = 'OUTPUT/IMG'
-OUTPUT_COR_FOLDER = 'OUTPUT/COR'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
+# Multi-frame uploads for /animation; CRAFT reruns when more than SCENE_CHANGE_RATIO of a frame
+# changes or every KEYFRAME_INTERVAL frames, and at most MAX_ANIMATION_FRAMES frames are accepted
+ANIMATION_EXTENSIONS = {'gif', 'mp4', 'mov', 'avi', 'webm', 'mkv'}
+SCENE_CHANGE_RATIO = float(os.environ.get('UNMARKR_SCENE_CHANGE_RATIO', 0.01))
+KEYFRAME_INTERVAL = int(os.environ.get('UNMARKR_KEYFRAME_INTERVAL', 30))
+MAX_ANIMATION_FRAMES = int(os.environ.get('UNMARKR_MAX_ANIMATION_FRAMES', 3000))
+# Model backend: 'torch' (CRAFT + LaMa), 'torchscript'/'onnx' (graphs from CODE/export_models.py)
+# or 'stub' (offline stand-ins, no weights needed); CRAFT_INT8 loads the quantized CRAFT export
+MODEL_BACKEND = os.environ.get('UNMARKR_BACKEND', 'torch')
+CRAFT_INT8 = os.environ.get('UNMARKR_CRAFT_INT8', '0') == '1'
+# Model stages loaded at startup (e.g. 'detect' for detection + OCR deployments; others load on first use),
+# whether that happens on a background thread so the server starts answering at once, and the warm-up run
+PRELOAD_STAGES = tuple(name for name in os.environ.get('UNMARKR_PRELOAD', ','.join(MODEL_STAGES)).split(',') if name)
+BACKGROUND_LOAD = os.environ.get('UNMARKR_BACKGROUND_LOAD', '1') == '1'
+WARM_UP = os.environ.get('UNMARKR_WARM_UP', '1') == '1'
+CRAFT_MODEL_PATH = os.path.join(BASE_DIR, 'CRAFT', 'craft_mlt_25k.pth')
+LAMA_MODEL_PATH = os.path.join(BASE_DIR, 'lama', 'big-lama')
+MASK_RADIUS = 5
+# Build the removal mask from detected boxes, or directly from the CRAFT score maps ('scores')
+MASK_SOURCE = os.environ.get('UNMARKR_MASK_SOURCE', 'boxes')
+if MASK_SOURCE not in MASK_SOURCES:
+    raise ValueError(f"Unknown UNMARKR_MASK_SOURCE '{MASK_SOURCE}', expected one of {list(MASK_SOURCES)}")
+# Default inpainting quality: 'refine' (LaMa + refinement), 'fast' (single-pass LaMa, batches
+# across images), 'classical' (OpenCV) or 'auto' (classical for tiny masks); overridable per request
+INPAINT_QUALITY = os.environ.get('UNMARKR_QUALITY', 'refine')
+LAMA_N_ITERS = int(os.environ.get('UNMARKR_LAMA_N_ITERS', 5))
+LAMA_MAX_SCALES = int(os.environ.get('UNMARKR_LAMA_MAX_SCALES', 3))
+# Largest mask, as a fraction of the image, that 'auto' hands to classical inpainting
+CLASSICAL_MAX_MASK_RATIO = float(os.environ.get('UNMARKR_CLASSICAL_MAX_MASK_RATIO', 0.002))
+# Inpaint only padded tiles around the mask instead of the whole image
+TILE_INPAINTING = os.environ.get('UNMARKR_TILE_INPAINT', '1') == '1'
+TILE_PADDING = int(os.environ.get('UNMARKR_TILE_PADDING', 64))
+# Longer side (pixels) that large uploads are detected and inpainted at before compositing back
+# at full resolution (0 = always full resolution), and the smallest text height kept while downscaling
+WORKING_MAX_SIDE = int(os.environ.get('UNMARKR_WORKING_MAX_SIDE', 2048))
+MIN_TEXT_HEIGHT = int(os.environ.get('UNMARKR_MIN_TEXT_HEIGHT', 12))
+# Detect images whose longer side exceeds this many pixels at full resolution over overlapping tiles
+# (0 = off; ~768 keeps CRAFT near native scale), the tile overlap, and threads running tile batches
+DETECT_TILE_SIZE = int(os.environ.get('UNMARKR_DETECT_TILE_SIZE', 0))
+DETECT_TILE_OVERLAP = int(os.environ.get('UNMARKR_DETECT_TILE_OVERLAP', 128))
+DETECT_WORKERS = int(os.environ.get('UNMARKR_DETECT_WORKERS', 1))
+# Forked model worker processes sharing one copy of the weights (0 = run models in the server process),
+# and torch/OpenCV threads per worker (0 = split the node's cores evenly between the workers)
+MODEL_WORKERS = int(os.environ.get('UNMARKR_MODEL_WORKERS', 0))
+THREADS_PER_WORKER = int(os.environ.get('UNMARKR_THREADS_PER_WORKER', 0))
+# OCR regions processed concurrently, and the backend ('tesserocr' keeps a persistent Tesseract handle)
+OCR_WORKERS = int(os.environ.get('UNMARKR_OCR_WORKERS', 4))
+OCR_ENGINE = os.environ.get('UNMARKR_OCR_ENGINE', 'pytesseract')
+# Largest number of images accepted by /batch and stacked into one forward pass
+BATCH_MAX_SIZE = int(os.environ.get('UNMARKR_BATCH_MAX_SIZE', 8))
+# Parent directory for per-request workspaces (None uses the system temp dir)
+WORKSPACE_ROOT = os.environ.get('UNMARKR_WORKSPACE_ROOT')
+# Keep image, boxes and mask in memory between stages; set to 0 to write every stage to a workspace
+IN_MEMORY_PIPELINE = os.environ.get('UNMARKR_IN_MEMORY', '1') == '1'
+OUTPUT_JPEG_QUALITY = 95
+# Async job queue: pipeline workers, pending jobs before 429, and how long results are kept
+JOB_WORKERS = int(os.environ.get('UNMARKR_JOB_WORKERS', max(2, MODEL_WORKERS)))
+JOB_QUEUE_SIZE = int(os.environ.get('UNMARKR_JOB_QUEUE_SIZE', 16))
+JOB_RESULT_TTL = int(os.environ.get('UNMARKR_JOB_RESULT_TTL', 600))
+# Interactive edit sessions kept in memory (original, mask and result per session) and their idle timeout
+SESSION_MAX = int(os.environ.get('UNMARKR_SESSION_MAX', 16))
+SESSION_TTL = int(os.environ.get('UNMARKR_SESSION_TTL', 1800))
+# Result cache for repeat uploads: memory LRU size, and an optional on-disk tier
+CACHE_ENABLED = os.environ.get('UNMARKR_CACHE', '1') == '1'
+CACHE_MEMORY_MB = int(os.environ.get('UNMARKR_CACHE_MEMORY_MB', 256))
+CACHE_DISK_DIR = os.environ.get('UNMARKR_CACHE_DIR')
+CACHE_DISK_MB = int(os.environ.get('UNMARKR_CACHE_DISK_MB', 2048))
+# Fraction of jobs run under a profiler ('cprofile' or 'torch'), written to UNMARKR_PROFILE_DIR
+PROFILE_SAMPLE_RATE = float(os.environ.get('UNMARKR_PROFILE_SAMPLE_RATE', 0.0))
+PROFILER = os.environ.get('UNMARKR_PROFILER', 'cprofile')
+PROFILE_DIR = os.environ.get('UNMARKR_PROFILE_DIR', os.path.join(BASE_DIR, 'PROFILES'))
+# Caller-supplied X-Request-ID values accepted as trace ids; anything else gets a fresh id
+TRACE_ID_PATTERN = re.compile(r'[A-Za-z0-9_-]{1,64}')
+# Request limits: body size (checked before reading) and image pixels (checked from the header, before decoding)
+MAX_UPLOAD_MB = int(os.environ.get('UNMARKR_MAX_UPLOAD_MB', 25))
+MAX_IMAGE_PIXELS = int(os.environ.get('UNMARKR_MAX_IMAGE_PIXELS', 50_000_000))
+# Result formats: base64 'json' (default), 'multipart' (JSON part + binary image parts) or 'url' (fetch /jobs/<id>/image)
+RESPONSE_MODES = ('json', 'multipart', 'url')
+STREAM_CHUNK_SIZE = 64 * 1024
+# Seconds the synchronous /upload waits for its job before answering 504
+UPLOAD_TIMEOUT = int(os.environ.get('UNMARKR_UPLOAD_TIMEOUT', 300))
 
-# Create all necessary folders (removed UPLOAD_FOLDER)
-for folder in [INPUT_IMG_FOLDER, INPUT_TXT_FOLDER, INPUT_MASK_FOLDER, OUTPUT_IMG_FOLDER, OUTPUT_COR_FOLDER]:
-    os.makedirs(folder, exist_ok=True)
+# Werkzeug rejects larger bodies with 413 before they are read
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_MB * 1024 * 1024
 
-def allowed_file(filename):
-    """Check if the file extension is allowed"""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+# Load CRAFT and LaMa once at server start; they stay resident for every request
+pipeline = TextRemovalPipeline(CRAFT_MODEL_PATH, LAMA_MODEL_PATH, radius=MASK_RADIUS,
+                               quality=INPAINT_QUALITY, n_iters=LAMA_N_ITERS, max_scales=LAMA_MAX_SCALES,
+                               classical_max_ratio=CLASSICAL_MAX_MASK_RATIO, max_batch_size=BATCH_MAX_SIZE,
+                               ocr_workers=OCR_WORKERS, ocr_engine=OCR_ENGINE,
+                               tile_inpainting=TILE_INPAINTING, tile_padding=TILE_PADDING,
+                               mask_source=MASK_SOURCE, backend=MODEL_BACKEND,
+                               working_max_side=WORKING_MAX_SIDE, min_text_height=MIN_TEXT_HEIGHT,
+                               craft_int8=CRAFT_INT8, detect_tile_size=DETECT_TILE_SIZE,
+                               detect_tile_overlap=DETECT_TILE_OVERLAP, detect_workers=DETECT_WORKERS,
+                               preload=())
+model_state = {'status': 'loading', 'stages': list(PRELOAD_STAGES), 'error': None,
+               'load_seconds': None, 'warm_up_seconds': None}
 
-def cleanup_folders():
-    """Clean up all INPUT and OUTPUT folders after processing"""
+def load_models(warm_up=WARM_UP):
+    """Load (and warm up) the preloaded model stages, recording progress for the readiness check"""
     try:
-        folders_to_clean = [
-            INPUT_IMG_FOLDER,
-            INPUT_TXT_FOLDER, 
-            INPUT_MASK_FOLDER,
-            OUTPUT_IMG_FOLDER,
-            OUTPUT_COR_FOLDER
-        ]
-        
-        for folder in folders_to_clean:
-            if os.path.exists(folder):
-                # Remove all files in the folder
-                for filename in os.listdir(folder):
-                    file_path = os.path.join(folder, filename)
-                    try:
-                        if os.path.isfile(file_path):
-                            os.unlink(file_path)
-                        elif os.path.isdir(file_path):
-                            shutil.rmtree(file_path)
-                    except Exception as e:
-                        print(f"Error deleting {file_path}: {e}")
-        
-        print("All processing folders cleaned successfully")
-        return True
-        
+        start = time.time()
+        pipeline.load(PRELOAD_STAGES)
+        model_state['load_seconds'] = round(time.time() - start, 3)
+        if warm_up:
+            start = time.time()
+            pipeline.warm_up(PRELOAD_STAGES)
+            model_state['warm_up_seconds'] = round(time.time() - start, 3)
+        model_state['status'] = 'ready'
+        print(f"Models ready: {', '.join(PRELOAD_STAGES) or 'none preloaded'}")
     except Exception as e:
-        print(f"Error during cleanup: {e}")
-        return False
+        model_state['status'] = 'failed'
+        model_state['error'] = str(e)
+        print(f"Model loading failed: {e}")
 
-def run_python_script(script_path, args):
-    """Run a Python script with given arguments"""
-    try:
-        cmd = [sys.executable, script_path] + args
-        result = subprocess.run(cmd, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
-        
-        if result.returncode != 0:
-            print(f"Error running {script_path}:")
-            """ print(f"STDOUT: {result.stdout}")
-            print(f"STDERR: {result.stderr}") """
-            return False, result.stderr
-        
-        print(f"Successfully ran {script_path}")
-        """ print(f"STDOUT: {result.stdout}") """
-        return True, result.stdout
-        
-    except Exception as e:
-        print(f"Exception running {script_path}: {str(e)}")
-        return False, str(e)
+if MODEL_WORKERS > 0:
+    # Weights must be in memory before the fork to be shared; the workers warm up themselves
+    load_models(warm_up=False)
+    engine = ModelServerPool(pipeline, MODEL_WORKERS, THREADS_PER_WORKER or None,
+                             warm_up=PRELOAD_STAGES if WARM_UP else ())
+elif BACKGROUND_LOAD:
+    engine = pipeline
+    threading.Thread(target=load_models, name='model-loader', daemon=True).start()
+else:
+    engine = pipeline
+    load_models()
+result_cache = ResultCache(max_memory_bytes=CACHE_MEMORY_MB * 1024 * 1024, disk_dir=CACHE_DISK_DIR,
+                           max_disk_bytes=CACHE_DISK_MB * 1024 * 1024) if CACHE_ENABLED else None
+sessions = SessionStore(max_sessions=SESSION_MAX, ttl=SESSION_TTL)
+jobs = JobQueue(num_workers=JOB_WORKERS, max_queue_size=JOB_QUEUE_SIZE, result_ttl=JOB_RESULT_TTL,
+                profile_rate=PROFILE_SAMPLE_RATE, profiler=PROFILER, profile_dir=PROFILE_DIR)
+
+def allowed_file(filename, extensions=ALLOWED_EXTENSIONS):
+    """Check if the file extension is allowed"""
+    return '.' in filename and \
+           filename.rsplit('.', 1)[1].lower() in extensions
+
+@contextmanager
+def job_workspace():
+    """Create an isolated INPUT/OUTPUT folder tree for one job and remove it afterwards"""
+    with tempfile.TemporaryDirectory(prefix='unmarkr_', dir=WORKSPACE_ROOT) as root:
+        workspace = {
+            'root': root,
+            'input_img': os.path.join(root, 'INPUT', 'IMG'),
+            'output_img': os.path.join(root, 'OUTPUT', 'IMG'),
+            'output_cor': os.path.join(root, 'OUTPUT', 'COR')
+        }
+        for key in ['input_img', 'output_img', 'output_cor']:
+            os.makedirs(workspace[key], exist_ok=True)
+        yield workspace
 
-def process_text_removal_pipeline(image_data):
-    """Execute the complete text removal pipeline using image data directly"""
-    temp_file = None
+def process_text_removal_pipeline(image_data, workspace, quality=None):
+    """Execute the complete text removal pipeline inside the job's own workspace; returns the inpainting tier used"""
     try:
-        # Step 1: Save image as testImg.jpg in INPUT/IMG folder
-        test_img_path = os.path.join(INPUT_IMG_FOLDER, 'testImg.jpg')
+        # Step 1: Save image as testImg.jpg in the workspace INPUT/IMG folder
+        test_img_path = os.path.join(workspace['input_img'], 'testImg.jpg')
         
         # Open image from bytes and save as JPG
         with Image.open(io.BytesIO(image_data)) as img:
@@ -97,151 +201,785 @@ def process_text_removal_pipeline(image_data):
             img.save(test_img_path, 'JPEG', quality=95)
         print(f"Step 1: Image saved as {test_img_path}")
         
+        # Decode once and run every stage in-process on the same array
+        image = cv2.imread(test_img_path)[:, :, ::-1].copy()  # BGR to RGB
+
         # Step 2: Run CRAFT text detection
-        craft_script = os.path.join('CODE', 'craft_detector.py')
-        craft_args = [
-            '--image_path', test_img_path,
-            '--model_path', 'CRAFT/craft_mlt_25k.pth'
-        ]
-        success, output = run_python_script(craft_script, craft_args)
-        if not success:
-            return False, f"CRAFT detection failed: {output}"
-        print("Step 2: CRAFT text detection completed")
-        
-        # Step 3: Generate masks
-        draw_mask_script = os.path.join('CODE', 'drawMask.py')
-        draw_mask_args = [
-            '--coor_folder', INPUT_TXT_FOLDER,
-            '--input_folder', INPUT_IMG_FOLDER,
-            '--output_folder', INPUT_MASK_FOLDER,
-            '--radius', '5'
-        ]
-        success, output = run_python_script(draw_mask_script, draw_mask_args)
-        if not success:
-            return False, f"Mask generation failed: {output}"
+        boxes = engine.detect(image)
+        print(f"Step 2: CRAFT text detection completed ({len(boxes)} regions)")
+        
+        # Step 3: Generate mask
+        mask = engine.mask(image, boxes)
         print("Step 3: Mask generation completed")
         
+        # Step 5 only needs the boxes, so OCR runs while step 4 inpaints
+        text_coords = pipeline.ocr_runner.submit(in_current_trace(engine.ocr), image, boxes)
+        
         # Step 4: Run LaMa inpainting
-        inpaint_script = os.path.join('CODE', 'inpaint_lama.py')
-        inpaint_args = [
-            '--model_path', 'lama/big-lama',
-            '--image_folder', INPUT_IMG_FOLDER,
-            '--mask_folder', INPUT_MASK_FOLDER,
-            '--output_folder', OUTPUT_IMG_FOLDER
-        ]
-        success, output = run_python_script(inpaint_script, inpaint_args)
-        if not success:
-            return False, f"LaMa inpainting failed: {output}"
-        print("Step 4: LaMa inpainting completed")
+        cleaned, inpaint_tier = engine.inpaint(image, mask, quality)
+        cv2.imwrite(os.path.join(workspace['output_img'], 'testImg.jpg'), cleaned[:, :, ::-1])  # RGB to BGR
+        print(f"Step 4: Inpainting completed ({inpaint_tier})")
         
         # Step 5: Extract text with coordinates
-        extract_script = os.path.join('CODE', 'extract_text.py')
-        extract_args = [
-            '--image_path', test_img_path,
-            '--coor_path', os.path.join(INPUT_TXT_FOLDER, 'testImg.txt'),
-            '--output_path', os.path.join(OUTPUT_COR_FOLDER, 'testImg_Cor.txt')
-        ]
-        success, output = run_python_script(extract_script, extract_args)
-        if not success:
-            return False, f"Text extraction failed: {output}"
+        text_coords = text_coords.result()
+        with open(os.path.join(workspace['output_cor'], 'testImg_Cor.txt'), 'w', encoding='utf-8') as f:
+            for entry in text_coords:
+                f.write(",".join(map(str, entry['coordinates'])) + f",{entry['text']}\n")
         print("Step 5: Text extraction completed")
         
-        return True, "Pipeline completed successfully"
+        return True, inpaint_tier
         
     except Exception as e:
         return False, f"Pipeline error: {str(e)}"
 
+def read_pipeline_results(workspace):
+    """Collect the cleaned image and text coordinates written to a job workspace"""
+    # Read the cleaned image
+    cleaned_image_path = os.path.join(workspace['output_img'], 'testImg.jpg')
+    if not os.path.exists(cleaned_image_path):
+        raise FileNotFoundError('Cleaned image not found')
+    
+    with open(cleaned_image_path, 'rb') as img_file:
+        cleaned_image_data = img_file.read()
+    
+    # Read the text coordinates file
+    text_coords_path = os.path.join(workspace['output_cor'], 'testImg_Cor.txt')
+    text_coords = []
+    if os.path.exists(text_coords_path):
+        with open(text_coords_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    parts = line.split(',')
+                    if len(parts) >= 9:  # 8 coordinates + text
+                        coords = [int(parts[i]) for i in range(8)]
+                        text = ','.join(parts[8:])  # text might contain commas
+                        text_coords.append({
+                            'coordinates': coords,
+                            'text': text
+                        })
+    
+    # Get image dimensions
+    with Image.open(cleaned_image_path) as img:
+        width, height = img.size
+    
+    return {
+        'cleaned_image': cleaned_image_data,
+        'text_coordinates': text_coords,
+        'width': width,
+        'height': height
+    }
+
+def decode_image(image_data):
+    """Decode uploaded bytes into an RGB numpy array"""
+    with stage('decode'), Image.open(io.BytesIO(image_data)) as img:
+        return np.array(img.convert('RGB'))
+
+def encode_image(image):
+    """Encode an RGB numpy array as the JPEG returned to the client"""
+    with stage('encode'):
+        success, buffer = cv2.imencode('.jpg', image[:, :, ::-1], [cv2.IMWRITE_JPEG_QUALITY, OUTPUT_JPEG_QUALITY])
+    if not success:
+        raise ValueError('Could not encode cleaned image')
+    return buffer.tobytes()
+
+def encode_mask(mask):
+    """Encode a binary mask as a PNG"""
+    with stage('encode'):
+        success, buffer = cv2.imencode('.png', mask)
+    if not success:
+        raise ValueError('Could not encode mask')
+    return buffer.tobytes()
+
+def result_cache_key(image, quality=None):
+    """Cache key for an image under the current pipeline and output settings"""
+    params = pipeline.params(quality)
+    params['jpeg_quality'] = OUTPUT_JPEG_QUALITY
+    return cache_key(image, params)
+
+def run_and_encode(images, quality=None, stages=PIPELINE_STAGES):
+    """Run the pipeline stages on decoded images (batched when several) and build the client results"""
+    if len(images) == 1:
+        results = [engine.run(images[0], quality, stages)]
+    else:
+        results = engine.run_batch(images, quality, True, stages)
+    
+    encoded = []
+    for image, result in zip(images, results):
+        item = {
+            'text_coordinates': result['text_coordinates'],
+            'inpaint_tier': result['inpaint_tier'],
+            'width': image.shape[1],
+            'height': image.shape[0]
+        }
+        if result['cleaned_image'] is not None:
+            item['cleaned_image'] = encode_image(result['cleaned_image'])
+        elif result['mask'] is not None:
+            item['mask_image'] = encode_mask(result['mask'])
+            item['mimetype'] = 'image/png'
+        # Partial runs say what ran and return the raw boxes, unless a score-map mask skipped them
+        if stages != PIPELINE_STAGES:
+            item['stages'] = list(stages)
+            if result['boxes'] is not None:
+                item['boxes'] = np.asarray(result['boxes']).reshape(-1, 8).tolist()
+        encoded.append(item)
+    return encoded
+
+def process_decoded(images, quality=None, stages=PIPELINE_STAGES):
+    """Serve cached results where possible and run the pipeline only on the misses; partial stage runs are not cached"""
+    if result_cache is None or stages != PIPELINE_STAGES:
+        return run_and_encode(images, quality, stages)
+    
+    keys = [result_cache_key(image, quality) for image in images]
+    results = [result_cache.get(key) for key in keys]
+    misses = [i for i, result in enumerate(results) if result is None]
+    if misses:
+        fresh = run_and_encode([images[i] for i in misses], quality, stages)
+        for i, result in zip(misses, fresh):
+            result_cache.put(keys[i], result)
+            results[i] = result
+    return results
+
+def process_in_memory(image_data, quality=None, stages=PIPELINE_STAGES):
+    """Run the pipeline without touching disk: decode once, keep arrays in memory, encode once"""
+    try:
+        return True, process_decoded([decode_image(image_data)], quality, stages)[0]
+    except Exception as e:
+        return False, f"Pipeline error: {str(e)}"
+
+def process_batch(image_datas, quality=None, stages=PIPELINE_STAGES):
+    """Run several uploads through the batch engine, sharing forward passes between them"""
+    try:
+        return True, process_decoded([decode_image(image_data) for image_data in image_datas], quality, stages)
+    except Exception as e:
+        return False, f"Pipeline error: {str(e)}"
+
+def process_in_workspace(image_data, quality=None):
+    """Run the pipeline through a per-job workspace on disk"""
+    with job_workspace() as workspace:
+        success, message = process_text_removal_pipeline(image_data, workspace, quality)
+        if not success:
+            return False, message
+        try:
+            result = read_pipeline_results(workspace)
+        except Exception as e:
+            return False, f"Error reading results: {str(e)}"
+        result['inpaint_tier'] = message
+        return True, result
+
+def process_image(image_data, quality=None, stages=PIPELINE_STAGES):
+    """Process an uploaded image with the configured pipeline mode; partial stage runs always stay in memory"""
+    if IN_MEMORY_PIPELINE or stages != PIPELINE_STAGES:
+        return process_in_memory(image_data, quality, stages)
+    return process_in_workspace(image_data, quality)
+
+def limit_frames(frames):
+    """Pass frames through, failing once there are too many or they are too large"""
+    for index, (frame, duration) in enumerate(frames):
+        if index >= MAX_ANIMATION_FRAMES:
+            raise ValueError(f'Too many frames, at most {MAX_ANIMATION_FRAMES}')
+        if frame.shape[0] * frame.shape[1] > MAX_IMAGE_PIXELS:
+            raise ValueError(f'Frame too large: exceeds {MAX_IMAGE_PIXELS} pixels')
+        yield frame, duration
+
+def process_animation(data, extension, quality=None):
+    """Remove text from an animated GIF or a video, re-encoding it in the same kind of container"""
+    summary = {}
+    
+    def cleaned_frames(frames):
+        return remove_text_frames(engine, limit_frames(frames), quality, scene_threshold=SCENE_CHANGE_RATIO,
+                                  keyframe_interval=KEYFRAME_INTERVAL, batch_size=BATCH_MAX_SIZE, summary=summary)
+    
+    try:
+        if extension == 'gif':
+            with Image.open(io.BytesIO(data)) as image:
+                width, height = image.size
+                output = encode_gif(cleaned_frames(gif_frames(image)), loop=image.info.get('loop'))
+            mimetype = 'image/gif'
+        else:
+            # OpenCV only decodes and encodes video through files
+            with tempfile.TemporaryDirectory(prefix='unmarkr_', dir=WORKSPACE_ROOT) as workspace:
+                input_path = os.path.join(workspace, f'input.{extension}')
+                output_path = os.path.join(workspace, 'output.mp4')
+                with open(input_path, 'wb') as f:
+                    f.write(data)
+                _, width, height = encode_video(cleaned_frames(video_frames(input_path)), output_path)
+                with open(output_path, 'rb') as f:
+                    output = f.read()
+            mimetype = 'video/mp4'
+    except ValueError as e:
+        return False, str(e), 400  # undecodable, empty or oversize input
+    
+    tiers = summary['tiers']
+    return True, {
+        'cleaned_image': output,
+        'mimetype': mimetype,
+        'text_coordinates': summary['text_coordinates'],
+        'inpaint_tier': max(tiers, key=tiers.get) if tiers else 'none',
+        'width': width,
+        'height': height,
+        'animation': {key: summary[key] for key in ('frames', 'keyframes', 'inpainted_frames', 'repeated_frames')}
+    }
+
+def session_result(session):
+    """Client result for the current state of an edit session"""
+    return {
+        'session_id': session.id,
+        'edits': session.edits,
+        'cleaned_image': encode_image(session.cleaned),
+        'text_coordinates': session.text_coordinates,
+        'inpaint_tier': session.inpaint_tier,
+        'width': session.image.shape[1],
+        'height': session.image.shape[0]
+    }
+
+def start_session(image_data, quality=None):
+    """Run the full pipeline on an upload and keep its state for incremental edits"""
+    image = decode_image(image_data)
+    session = sessions.create(image, engine.run(image, quality), quality)
+    return True, session_result(session)
+
+def edit_session(session, add, remove, quality=None):
+    """Apply mask deltas to a session, re-inpainting only around the added regions"""
+    session.apply_edits(engine, add, remove, quality)
+    return True, session_result(session)
+
+def read_polygons(edits, key):
+    """Flat [x1, y1, x2, y2, ...] polygons from an edit request; returns (polygons, None) or (None, error response)"""
+    polygons = edits.get(key) or []
+    if not isinstance(polygons, list):
+        return None, (jsonify({'error': f"'{key}' must be a list of polygons"}), 400)
+    for polygon in polygons:
+        if not isinstance(polygon, list) or len(polygon) < 6 or len(polygon) % 2 \
+                or not all(isinstance(v, (int, float)) for v in polygon):
+            return None, (jsonify({'error': f"Each '{key}' polygon must be a flat list of at least 3 x, y pairs"}), 400)
+    return polygons, None
+
+def read_quality(quality=None):
+    """Per-request quality knob (form field 'quality' unless given); returns (quality, None) or (None, error response)"""
+    quality = quality or request.form.get('quality') or None
+    if quality is not None and quality not in QUALITY_LEVELS:
+        return None, (jsonify({'error': f"Unknown quality '{quality}', expected one of {list(QUALITY_LEVELS)}"}), 400)
+    return quality, None
+
+def read_stages(stages=None):
+    """
+    Requested pipeline stages (query or form field 'stages', comma separated,
+    unless given) plus the stages they need; returns (stages, None) or (None, error response)
+    """
+    value = stages or request.args.get('stages') or request.form.get('stages') or ''
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    if not names:
+        return PIPELINE_STAGES, None
+    try:
+        return required_stages(names), None
+    except ValueError as e:
+        return None, (jsonify({'error': f"{e}, expected some of {list(PIPELINE_STAGES)}"}), 400)
+
+def request_trace_id():
+    """Trace id for this request: the caller's X-Request-ID if it is a short plain token, or a new one"""
+    if 'trace_id' not in g:
+        trace_id = request.headers.get('X-Request-ID', '')
+        g.trace_id = trace_id if TRACE_ID_PATTERN.fullmatch(trace_id) else uuid.uuid4().hex
+    return g.trace_id
+
+@app.after_request
+def add_trace_header(response):
+    """Echo the trace id so clients can correlate logs and metrics"""
+    if 'trace_id' in g:
+        response.headers['X-Trace-Id'] = g.trace_id
+    return response
+
+def read_uploaded_image():
+    """Validate the uploaded file; returns (image_data, None) or (None, error response)"""
+    # Check if image file is present in request
+    if 'image' not in request.files:
+        return None, (jsonify({'error': 'No image file provided'}), 400)
+    
+    file = request.files['image']
+    
+    # Check if file is selected
+    if file.filename == '':
+        return None, (jsonify({'error': 'No file selected'}), 400)
+    
+    # Check if file type is allowed
+    if not allowed_file(file.filename):
+        return None, (jsonify({'error': 'File type not allowed'}), 400)
+    
+    # Read the file data directly into memory
+    image_data = file.read()
+    
+    error = check_image_size(image_data)
+    if error:
+        return None, error
+    
+    return image_data, None
+
+def check_image_size(image_data):
+    """Reject unreadable or oversize images from their header, before any pixels are decoded"""
+    try:
+        with Image.open(io.BytesIO(image_data)) as img:
+            width, height = img.size
+    except Image.DecompressionBombError:
+        # Pillow refuses headers far above its own pixel limit before we see the size
+        return jsonify({'error': f'Image too large: exceeds {MAX_IMAGE_PIXELS} pixels'}), 413
+    except Exception:
+        return jsonify({'error': 'Could not read image'}), 400
+    if width * height > MAX_IMAGE_PIXELS:
+        return jsonify({'error': f'Image too large: {width}x{height} exceeds {MAX_IMAGE_PIXELS} pixels'}), 413
+    return None
+
+def read_response_mode():
+    """Requested result format (query or form field 'response'); returns (mode, None) or (None, error response)"""
+    mode = request.args.get('response') or request.form.get('response') or 'json'
+    if mode not in RESPONSE_MODES:
+        return None, (jsonify({'error': f"Unknown response mode '{mode}', expected one of {list(RESPONSE_MODES)}"}), 400)
+    return mode, None
+
+def result_image(result):
+    """Image bytes of a result: the cleaned image, the mask of a run stopped after masking, or None"""
+    return result.get('cleaned_image', result.get('mask_image'))
+
+def build_result_metadata(result):
+    """Everything about a finished result except the image bytes"""
+    metadata = {
+        'message': 'Text removal completed successfully',
+        'text_coordinates': result['text_coordinates'],
+        'inpaint_tier': result.get('inpaint_tier'),
+        'width': result['width'],
+        'height': result['height']
+    }
+    image = result_image(result)
+    if image is not None:
+        metadata['file_size'] = len(image)
+        metadata['mimetype'] = result.get('mimetype', 'image/jpeg')
+    if 'stages' in result:
+        metadata['message'] = f"Pipeline stages completed: {', '.join(result['stages'])}"
+    for key in ('animation', 'session_id', 'edits', 'stages', 'boxes'):
+        if key in result:
+            metadata[key] = result[key]
+    return metadata
+
+def build_result_response(result):
+    """JSON payload for a finished pipeline result"""
+    response_data = build_result_metadata(result)
+    for key in ('cleaned_image', 'mask_image'):
+        if key in result:
+            response_data[key] = base64.b64encode(result[key]).decode('utf-8')
+    return response_data
+
+def build_job_response(result):
+    """JSON payload for a finished job, either a single image or a /batch list"""
+    if isinstance(result, list):
+        return {'results': [build_result_response(item) for item in result]}
+    return build_result_response(result)
+
+def stream_multipart(metadata, images):
+    """multipart/mixed body: one small JSON part, then each (bytes, mimetype) image as a binary part, streamed in chunks"""
+    boundary = uuid.uuid4().hex
+    
+    def generate():
+        yield (f'--{boundary}\r\nContent-Type: application/json\r\n\r\n').encode('utf-8')
+        yield json.dumps(metadata).encode('utf-8')
+        for index, (image_bytes, mimetype) in enumerate(images):
+            extension = mimetypes.guess_extension(mimetype) or '.bin'
+            yield (f'\r\n--{boundary}\r\nContent-Type: {mimetype}\r\n'
+                   f'Content-Disposition: attachment; name="cleaned_image"; filename="cleaned_{index}{extension}"\r\n'
+                   f'Content-Length: {len(image_bytes)}\r\n\r\n').encode('utf-8')
+            view = memoryview(image_bytes)
+            for start in range(0, len(view), STREAM_CHUNK_SIZE):
+                yield bytes(view[start:start + STREAM_CHUNK_SIZE])
+        yield f'\r\n--{boundary}--\r\n'.encode('utf-8')
+    
+    return Response(generate(), mimetype=f'multipart/mixed; boundary={boundary}')
+
+def finished_job_response(job, mode):
+    """Response for a finished job in the requested format"""
+    results = job.result if isinstance(job.result, list) else [job.result]
+    
+    if mode == 'json':
+        return jsonify(build_job_response(job.result)), 200
+    
+    metadata = [build_result_metadata(result) for result in results]
+    if mode == 'url':
+        for index, item in enumerate(metadata):
+            if result_image(results[index]) is not None:
+                item['image_url'] = f'/jobs/{job.id}/image?index={index}'
+    metadata = {'job_id': job.id, 'results': metadata} if isinstance(job.result, list) else dict(metadata[0], job_id=job.id)
+    
+    if mode == 'url':
+        return jsonify(metadata), 200
+    images = [(result_image(result), result.get('mimetype', 'image/jpeg')) for result in results
+              if result_image(result) is not None]
+    return stream_multipart(metadata, images), 200
+
+def wait_for_job(job, mode):
+    """Block until a job finishes and answer with its result, a 500, or a 504 to poll later"""
+    if not job.done.wait(UPLOAD_TIMEOUT):
+        return jsonify({
+            'error': 'Processing timed out, poll the job for its result',
+            'job_id': job.id
+        }), 504
+    
+    # The result went out with this response; only 'url' clients come back for /jobs/<id>/image
+    if job.status != 'done':
+        jobs.discard(job.id)
+        return jsonify({'error': f'Processing failed: {job.error}'}), job.error_status
+    
+    response = finished_job_response(job, mode)
+    if mode != 'url':
+        jobs.discard(job.id)
+    return response
+
+def queue_full_response():
+    """429 returned when the job queue cannot take more work"""
+    return jsonify({
+        'error': 'Server is busy, try again later',
+        'queue_depth': jobs.depth()
+    }), 429
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue an image for text removal and return its job id immediately"""
+    try:
+        image_data, error = read_uploaded_image()
+        if error:
+            return error
+        
+        quality, error = read_quality()
+        if error:
+            return error
+        
+        stages, error = read_stages()
+        if error:
+            return error
+        
+        try:
+            job = jobs.submit(process_image, image_data, quality, stages, kind='jobs', trace_id=request_trace_id())
+        except queue.Full:
+            return queue_full_response()
+        
+        return jsonify({
+            'trace_id': job.trace_id,
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': f'/jobs/{job.id}',
+            'result_url': f'/jobs/{job.id}/result'
+        }), 202
+        
+    except HTTPException:
+        raise  # e.g. 413 from MAX_CONTENT_LENGTH
+    except Exception as e:
+        return jsonify({'error': f'Error submitting job: {str(e)}'}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Report the status of a submitted job"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    status = job.to_dict()
+    status['queue_depth'] = jobs.depth()
+    return jsonify(status), 200
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    """Return the result of a finished job"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    if job.status == 'failed':
+        return jsonify({'error': f'Processing failed: {job.error}'}), job.error_status
+    
+    if job.status != 'done':
+        return jsonify({'error': 'Job not finished', 'status': job.status}), 409
+    
+    mode, error = read_response_mode()
+    if error:
+        return error
+    
+    return finished_job_response(job, mode)
+
+@app.route('/jobs/<job_id>/image', methods=['GET'])
+def job_image(job_id):
+    """Return a finished job's cleaned image (or animation) as a binary body"""
+    job = jobs.get(job_id)
+    if job is None or job.status != 'done':
+        return jsonify({'error': 'Result not available'}), 404
+    
+    results = job.result if isinstance(job.result, list) else [job.result]
+    index = request.args.get('index', 0, type=int)
+    if not 0 <= index < len(results):
+        return jsonify({'error': 'Image index out of range'}), 404
+    
+    image = result_image(results[index])
+    if image is None:
+        return jsonify({'error': 'Result has no image'}), 404
+    return Response(image, mimetype=results[index].get('mimetype', 'image/jpeg'))
+
 @app.route('/upload', methods=['POST'])
-def upload_image():
-    """Endpoint to receive image files from frontend and process text removal"""
+def upload_image(stages=None, kind='upload'):
+    """Endpoint to receive image files from frontend and process text removal (or only the requested stages)"""
+    try:
+        image_data, error = read_uploaded_image()
+        if error:
+            return error
+        
+        quality, error = read_quality()
+        if error:
+            return error
+        
+        stages, error = read_stages(stages)
+        if error:
+            return error
+        
+        mode, error = read_response_mode()
+        if error:
+            return error
+        
+        # Run through the job queue and wait for the result
+        try:
+            job = jobs.submit(process_image, image_data, quality, stages, kind=kind, trace_id=request_trace_id())
+        except queue.Full:
+            return queue_full_response()
+        
+        return wait_for_job(job, mode)
+        
+    except HTTPException:
+        raise  # e.g. 413 from MAX_CONTENT_LENGTH
+    except Exception as e:
+        return jsonify({'error': f'Error processing image: {str(e)}'}), 500
+
+@app.route('/detect', methods=['POST'])
+def detect_text():
+    """Text boxes only: CRAFT runs, masking, inpainting and OCR are skipped"""
+    return upload_image(stages='detect', kind='detect')
+
+@app.route('/ocr', methods=['POST'])
+def ocr_text():
+    """Text boxes and their text: masking and inpainting are skipped"""
+    return upload_image(stages='ocr', kind='ocr')
+
+@app.route('/batch', methods=['POST'])
+def upload_batch():
+    """Process several images (multipart field 'images') in shared CRAFT/LaMa forward passes"""
     try:
-        # Check if image file is present in request
-        if 'image' not in request.files:
-            return jsonify({'error': 'No image file provided'}), 400
+        files = request.files.getlist('images')
+        if not files:
+            return jsonify({'error': 'No image files provided'}), 400
+        
+        if len(files) > BATCH_MAX_SIZE:
+            return jsonify({'error': f'Too many images, at most {BATCH_MAX_SIZE} per batch'}), 400
+        
+        for file in files:
+            if file.filename == '' or not allowed_file(file.filename):
+                return jsonify({'error': f'File type not allowed: {file.filename}'}), 400
         
-        file = request.files['image']
+        quality, error = read_quality()
+        if error:
+            return error
         
-        # Check if file is selected
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
+        stages, error = read_stages()
+        if error:
+            return error
         
-        # Check if file type is allowed
-        if not allowed_file(file.filename):
+        mode, error = read_response_mode()
+        if error:
+            return error
+        
+        image_datas = [file.read() for file in files]
+        for image_data in image_datas:
+            error = check_image_size(image_data)
+            if error:
+                return error
+        
+        try:
+            job = jobs.submit(process_batch, image_datas, quality, stages, kind='batch', trace_id=request_trace_id())
+        except queue.Full:
+            return queue_full_response()
+        
+        return wait_for_job(job, mode)
+        
+    except HTTPException:
+        raise  # e.g. 413 from MAX_CONTENT_LENGTH
+    except Exception as e:
+        return jsonify({'error': f'Error processing images: {str(e)}'}), 500
+
+@app.errorhandler(413)
+def request_too_large(e):
+    """Uploads above MAX_CONTENT_LENGTH are refused before the body is read"""
+    return jsonify({'error': f'Upload too large, limit is {MAX_UPLOAD_MB} MB'}), 413
+
+@app.route('/animation', methods=['POST'])
+def upload_animation():
+    """Remove text from an animated GIF or a video (multipart field 'image')"""
+    try:
+        file = request.files.get('image')
+        if file is None or file.filename == '':
+            return jsonify({'error': 'No file provided'}), 400
+        
+        if not allowed_file(file.filename, ANIMATION_EXTENSIONS):
             return jsonify({'error': 'File type not allowed'}), 400
+        extension = file.filename.rsplit('.', 1)[1].lower()
         
-        # Read the file data directly into memory
-        image_data = file.read()
+        quality, error = read_quality()
+        if error:
+            return error
         
-        # Process the text removal pipeline directly from memory
-        success, message = process_text_removal_pipeline(image_data)
+        mode, error = read_response_mode()
+        if error:
+            return error
         
-        if not success:
-            # Clean up even if processing failed
-            cleanup_folders()
-            return jsonify({'error': f'Processing failed: {message}'}), 500
+        data = file.read()
+        if extension == 'gif':
+            error = check_image_size(data)
+            if error:
+                return error
         
-        # Step 6: Return the processed results
         try:
-            # Read the cleaned image
-            cleaned_image_path = os.path.join(OUTPUT_IMG_FOLDER, 'testImg.jpg')
-            if not os.path.exists(cleaned_image_path):
-                cleanup_folders()
-                return jsonify({'error': 'Cleaned image not found'}), 500
-            
-            with open(cleaned_image_path, 'rb') as img_file:
-                cleaned_image_data = img_file.read()
-                cleaned_image_base64 = base64.b64encode(cleaned_image_data).decode('utf-8')
-            
-            # Read the text coordinates file
-            text_coords_path = os.path.join(OUTPUT_COR_FOLDER, 'testImg_Cor.txt')
-            text_coords = []
-            if os.path.exists(text_coords_path):
-                with open(text_coords_path, 'r', encoding='utf-8') as f:
-                    for line in f:
-                        line = line.strip()
-                        if line:
-                            parts = line.split(',')
-                            if len(parts) >= 9:  # 8 coordinates + text
-                                coords = [int(parts[i]) for i in range(8)]
-                                text = ','.join(parts[8:])  # text might contain commas
-                                text_coords.append({
-                                    'coordinates': coords,
-                                    'text': text
-                                })
-            
-            # Get image dimensions
-            with Image.open(cleaned_image_path) as img:
-                width, height = img.size
-            
-            # Prepare response
-            response_data = {
-                'message': 'Text removal completed successfully',
-                'cleaned_image': cleaned_image_base64,
-                'text_coordinates': text_coords,
-                'width': width,
-                'height': height,
-                'file_size': len(cleaned_image_data)
-            }
-            
-            # Clean up all processing folders after preparing response
-            cleanup_folders()
-            
-            return jsonify(response_data), 200
-            
-        except Exception as e:
-            # Clean up on error
-            cleanup_folders()
-            return jsonify({'error': f'Error reading results: {str(e)}'}), 500
+            job = jobs.submit(process_animation, data, extension, quality, kind='animation', trace_id=request_trace_id())
+        except queue.Full:
+            return queue_full_response()
+        
+        return wait_for_job(job, mode)
         
+    except HTTPException:
+        raise  # e.g. 413 from MAX_CONTENT_LENGTH
     except Exception as e:
-        # Clean up on any exception
-        cleanup_folders()
-        return jsonify({'error': f'Error processing image: {str(e)}'}), 500
+        return jsonify({'error': f'Error processing animation: {str(e)}'}), 500
+
+@app.route('/sessions', methods=['POST'])
+def create_session():
+    """Process an image and keep its pipeline state so later edits are incremental"""
+    try:
+        image_data, error = read_uploaded_image()
+        if error:
+            return error
+        
+        quality, error = read_quality()
+        if error:
+            return error
+        
+        mode, error = read_response_mode()
+        if error:
+            return error
+        
+        try:
+            job = jobs.submit(start_session, image_data, quality, kind='session', trace_id=request_trace_id())
+        except queue.Full:
+            return queue_full_response()
+        
+        return wait_for_job(job, mode)
+        
+    except HTTPException:
+        raise  # e.g. 413 from MAX_CONTENT_LENGTH
+    except Exception as e:
+        return jsonify({'error': f'Error creating session: {str(e)}'}), 500
+
+@app.route('/sessions/<session_id>/edits', methods=['POST'])
+def edit_session_mask(session_id):
+    """Apply mask deltas: JSON {"add": [polygon, ...], "remove": [polygon, ...], "quality": optional}"""
+    try:
+        session = sessions.get(session_id)
+        if session is None:
+            return jsonify({'error': 'Session not found'}), 404
+        
+        edits = request.get_json(silent=True)
+        if not isinstance(edits, dict):
+            return jsonify({'error': 'Expected a JSON object with add/remove polygons'}), 400
+        
+        add, error = read_polygons(edits, 'add')
+        if error:
+            return error
+        remove, error = read_polygons(edits, 'remove')
+        if error:
+            return error
+        
+        quality, error = read_quality(edits.get('quality'))
+        if error:
+            return error
+        
+        mode, error = read_response_mode()
+        if error:
+            return error
+        
+        try:
+            job = jobs.submit(edit_session, session, add, remove, quality, kind='session_edit',
+                              trace_id=request_trace_id())
+        except queue.Full:
+            return queue_full_response()
+        
+        return wait_for_job(job, mode)
+        
+    except Exception as e:
+        return jsonify({'error': f'Error editing session: {str(e)}'}), 500
+
+@app.route('/sessions/<session_id>', methods=['DELETE'])
+def delete_session(session_id):
+    """Discard an edit session"""
+    if not sessions.delete(session_id):
+        return jsonify({'error': 'Session not found'}), 404
+    return jsonify({'session_id': session_id, 'status': 'deleted'}), 200
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Report result cache hit/miss counts"""
+    if result_cache is None:
+        return jsonify({'enabled': False}), 200
+    stats = result_cache.get_stats()
+    stats['enabled'] = True
+    return jsonify(stats), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus-style per-stage latency/memory histograms and service gauges"""
+    gauges = {'unmarkr_job_queue_depth': jobs.depth()}
+    if engine is not pipeline:
+        gauges['unmarkr_model_workers_alive'] = engine.alive()
+        gauges['unmarkr_model_workers_ready'] = engine.ready()
+        gauges['unmarkr_model_workers_expected'] = engine.num_workers
+    counters = {}
+    if result_cache is not None:
+        cache = result_cache.get_stats()
+        counters['unmarkr_cache_hits_total'] = cache['memory_hits'] + cache['disk_hits']
+        counters['unmarkr_cache_misses_total'] = cache['misses']
+    return Response(METRICS.render(gauges, counters), mimetype='text/plain; version=0.0.4')
+
+def is_ready():
+    """
+    Preloaded models are loaded and warmed up, and every model worker (if any)
+    has warmed up and is still running; dead workers are not replaced, so a
+    shrunken pool stays unready until the instance is restarted
+    """
+    if model_state['status'] != 'ready':
+        return False
+    return engine is pipeline or engine.ready() == engine.num_workers
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'message': 'Server is running'}), 200
+    """Health check endpoint: liveness plus model readiness"""
+    return jsonify({
+        'status': 'healthy',
+        'message': 'Server is running',
+        'live': True,
+        'ready': is_ready(),
+        'models': model_state,
+        'model_workers': None if engine is pipeline else {'expected': engine.num_workers, 'alive': engine.alive(),
+                                                          'ready': engine.ready()}
+    }), 200
+
+@app.route('/health/live', methods=['GET'])
+def liveness_check():
+    """Liveness probe: the server process answers requests"""
+    return jsonify({'live': True}), 200
+
+@app.route('/health/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: 503 until the preloaded models are loaded and warmed up"""
+    ready = is_ready()
+    return jsonify({'ready': ready, 'models': model_state}), 200 if ready else 503
 
 
 
@@ -249,5 +987,13 @@ if __name__ == '__main__':
     print("Starting Flask server with text removal pipeline...")
     print("Server will be available at: http://localhost:5000")
     print("Upload endpoint: http://localhost:5000/upload")
-    print("Health check: http://localhost:5000/health")
-    app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
+    print("Batch endpoint: http://localhost:5000/batch")
+    print("Animation endpoint: http://localhost:5000/animation")
+    print("Edit sessions: http://localhost:5000/sessions, /sessions/<id>/edits")
+    print("Job endpoints: http://localhost:5000/jobs, /jobs/<id>, /jobs/<id>/result, /jobs/<id>/image")
+    print("Metrics: http://localhost:5000/metrics")
+    print("Health check: http://localhost:5000/health (probes: /health/live, /health/ready)")
+    # Jobs no longer share folders, so requests can be served concurrently. The reloader would
+    # start a second process that loads every model again, so it is opt-in
+    app.run(debug=True, host='0.0.0.0', port=5000, threaded=True,
+            use_reloader=os.environ.get('UNMARKR_RELOADER', '0') == '1') 
\ No newline at end of file